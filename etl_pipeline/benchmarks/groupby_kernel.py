@@ -0,0 +1,207 @@
+"""Check the NumPy group-by kernel against the SQL the gold assets used to run, at several scales.
+
+Run from the etl_pipeline project directory:
+
+    python benchmarks/groupby_kernel.py --scales 1000,10000,100000
+
+Each scale is a synthetic orders/reviews/products set of that many orders. The customer review
+summary and the order baskets are computed with pandasql (the previous implementation) and
+with the kernel-based transforms, compared and timed; the review summary is also rebuilt
+incrementally from a state holding 80% of the rows, checking only the last 90 days of purchases
+again. Exits non-zero when any output differs.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pandasql as psql
+
+from etl_pipeline.transforms.baskets import build_order_baskets
+from etl_pipeline.transforms.customer_state import (
+    empty_review_state,
+    update_review_state,
+    review_summary_from_state
+)
+
+REVIEW_SUMMARY_SQL = """
+WITH review_summary AS (
+    SELECT
+        DISTINCT soo.customer_id,
+        COUNT(DISTINCT soo.order_id) AS total_orders,
+        COUNT(sor.review_id) AS total_reviews,
+        AVG(sor.score) AS average_review_score,
+        SUM(soo.payment_value) AS total_spent
+    FROM silver_olist_orders soo
+    JOIN silver_olist_reviews sor ON sor.order_id = soo.order_id
+    GROUP BY soo.customer_id
+)
+SELECT
+    rs.customer_id,
+    rs.total_orders,
+    rs.total_reviews,
+    rs.average_review_score,
+    rs.total_spent
+FROM review_summary rs
+ORDER BY rs.customer_id
+"""
+
+BASKETS_SQL = """
+WITH order_items AS (
+    SELECT
+        soo.order_id,
+        sop.product_category_name_english
+    FROM
+        silver_olist_orders soo
+    JOIN
+        silver_olist_products sop
+    ON
+        soo.product_id = sop.product_id
+)
+SELECT
+    order_id,
+    GROUP_CONCAT(product_category_name_english) AS list_of_products
+FROM
+    order_items
+GROUP BY
+    order_id
+ORDER BY
+    order_id
+"""
+
+LOOKBACK = pd.Timedelta(days=90)
+CATEGORIES = ["bed_bath_table", "health_beauty", "sports_leisure", "furniture_decor", "computers_accessories",
+              "housewares", "watches_gifts", "telephony", "garden_tools", "auto", "toys", "cool_stuff"]
+
+
+def generate(n_orders, seed=0):
+    # Order rows are items x payments, so an order spans several rows, some identical
+    rng = np.random.default_rng(seed)
+    n_customers = max(n_orders * 9 // 10, 1)
+    n_products = max(n_orders // 10, 10)
+
+    products = pd.DataFrame({
+        "product_id": [f"p{i:07d}" for i in range(n_products)],
+        "product_category_name_english": rng.choice(CATEGORIES, n_products)
+    })
+
+    order_ids = np.array([f"o{i:08d}" for i in range(n_orders)], dtype=object)
+    order_customers = np.array([f'"c{i:08d}"' for i in rng.integers(0, n_customers, n_orders)], dtype=object)
+    rows_per_order = rng.integers(1, 4, n_orders)
+    row_order = np.repeat(np.arange(n_orders), rows_per_order)
+    payments = rng.gamma(2.0, 60.0, len(row_order)).round(2)
+    payments[rng.random(len(row_order)) < 0.02] = np.nan
+    orders = pd.DataFrame({
+        "order_id": order_ids[row_order],
+        "customer_id": order_customers[row_order],
+        # orders spread over two years in id order, so later rows are later purchases
+        "order_purchase_timestamp": (pd.Timestamp("2017-01-01") + pd.to_timedelta(row_order * (730 * 24 * 3600 // n_orders), unit="s")).strftime("%Y-%m-%d %H:%M:%S"),
+        "product_id": products["product_id"].to_numpy()[rng.integers(0, n_products, len(row_order))],
+        "payment_value": payments,
+        "order_status": "delivered"
+    })
+
+    # Most orders get a review, some two, and a few reviews point at unknown or missing orders
+    reviews_per_order = rng.choice([0, 1, 2], n_orders, p=[0.05, 0.92, 0.03])
+    review_order = np.repeat(np.arange(n_orders), reviews_per_order)
+    review_order_ids = np.concatenate([order_ids[review_order], [f"x{i}" for i in range(n_orders // 100)]])
+    review_order_ids[rng.random(len(review_order_ids)) < 0.01] = None
+    scores = rng.integers(1, 6, len(review_order_ids)).astype("float64")
+    scores[rng.random(len(scores)) < 0.02] = np.nan
+    reviews = pd.DataFrame({
+        "review_id": [f"r{i:08d}" for i in range(len(review_order_ids))],
+        "order_id": review_order_ids,
+        "score": scores,
+        "title": None,
+        "comment": "ok"
+    })
+    return orders, reviews, products
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def sql_review_summary(orders, reviews):
+    summary = psql.sqldf(REVIEW_SUMMARY_SQL, {"silver_olist_orders": orders, "silver_olist_reviews": reviews})
+    summary["average_review_score"] = summary["average_review_score"].fillna(0)
+    summary["customer_id"] = summary["customer_id"].str.strip('"')
+    return summary
+
+
+def kernel_review_summary(orders, reviews):
+    state, _ = update_review_state(empty_review_state(), orders, reviews, LOOKBACK)
+    return review_summary_from_state(state)
+
+
+def incremental_review_summary(orders, reviews):
+    # state over the first 80% of the rows, then fold in the rest; only rows within the
+    # lookback of the latest purchase in the state are fingerprinted again
+    cut_orders, cut_reviews = int(len(orders) * 0.8), int(len(reviews) * 0.8)
+    state, _ = update_review_state(empty_review_state(), orders.iloc[:cut_orders], reviews.iloc[:cut_reviews], LOOKBACK)
+    (state, _), seconds = timed(lambda: update_review_state(state, orders, reviews, LOOKBACK))
+    return review_summary_from_state(state), seconds
+
+
+def same_review_summary(expected, actual):
+    if len(expected) != len(actual):
+        return False
+    expected, actual = expected.reset_index(drop=True), actual.reset_index(drop=True)
+    return (
+        (expected["customer_id"] == actual["customer_id"]).all()
+        and (expected["total_orders"].to_numpy() == actual["total_orders"].to_numpy()).all()
+        and (expected["total_reviews"].to_numpy() == actual["total_reviews"].to_numpy()).all()
+        and np.allclose(expected["average_review_score"], actual["average_review_score"], rtol=1e-9, equal_nan=True)
+        and np.allclose(expected["total_spent"].astype("float64"), actual["total_spent"], rtol=1e-9, equal_nan=True)
+    )
+
+
+def sql_baskets(orders, products):
+    return psql.sqldf(BASKETS_SQL, {"silver_olist_orders": orders, "silver_olist_products": products})
+
+
+def same_baskets(expected, actual):
+    # GROUP_CONCAT gives no order inside a group, so baskets compare as sorted lists
+    if len(expected) != len(actual) or not (expected["order_id"].to_numpy() == actual["order_id"].to_numpy()).all():
+        return False
+    expected_lists = [sorted(item.strip() for item in basket.split(",")) for basket in expected["list_of_products"]]
+    actual_lists = [sorted(basket) for basket in actual["list_of_products"].tolist()]
+    return expected_lists == actual_lists
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1000,10000,100000", help="comma-separated order counts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'orders':>9} {'output':<16} {'sql':>9} {'kernel':>9} {'speedup':>8} {'incr':>9}  match")
+    for scale in [int(s) for s in args.scales.split(",")]:
+        orders, reviews, products = generate(scale, args.seed)
+
+        expected, sql_seconds = timed(lambda: sql_review_summary(orders, reviews))
+        actual, kernel_seconds = timed(lambda: kernel_review_summary(orders, reviews))
+        incremental, incremental_seconds = incremental_review_summary(orders, reviews)
+        match = same_review_summary(expected, actual) and same_review_summary(expected, incremental)
+        failed |= not match
+        print(f"{scale:>9} {'review_summary':<16} {sql_seconds:>8.3f}s {kernel_seconds:>8.3f}s "
+              f"{sql_seconds / kernel_seconds:>7.1f}x {incremental_seconds:>8.3f}s  {match}")
+
+        expected, sql_seconds = timed(lambda: sql_baskets(orders, products))
+        actual, kernel_seconds = timed(lambda: build_order_baskets(orders, products))
+        match = same_baskets(expected, actual)
+        failed |= not match
+        print(f"{scale:>9} {'baskets':<16} {sql_seconds:>8.3f}s {kernel_seconds:>8.3f}s "
+              f"{sql_seconds / kernel_seconds:>7.1f}x {'':>9}  {match}")
+
+    if failed:
+        print("FAIL: kernel output differs from the SQL implementation")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measure how long the code location takes to import and which heavy libraries it pulls in.
+
+Run from the etl_pipeline project directory:
+
+    python benchmarks/import_time.py --max-overhead 0.5
+
+The cost of ``import dagster`` is measured separately and subtracted, so the reported
+overhead is what the definitions module itself adds. Exits non-zero when the overhead
+exceeds the budget or when a heavy library is imported just to build the Definitions.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "polars", "pandasql", "minio", "sqlalchemy", "psycopg2", "pymysql"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def probe(module):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(module, repeat):
+    runs = [probe(module) for _ in range(repeat)]
+    return statistics.median(run["seconds"] for run in runs), set(runs[-1]["modules"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-overhead", type=float, default=0.5, help="seconds allowed on top of `import dagster`")
+    args = parser.parse_args()
+
+    dagster_seconds, dagster_modules = measure("dagster", args.repeat)
+    pipeline_seconds, pipeline_modules = measure("etl_pipeline", args.repeat)
+    overhead = pipeline_seconds - dagster_seconds
+    heavy = sorted(
+        name for name in HEAVY_MODULES
+        if name in pipeline_modules and name not in dagster_modules
+    )
+
+    print(f"import dagster:      {dagster_seconds:.3f}s")
+    print(f"import etl_pipeline: {pipeline_seconds:.3f}s (+{overhead:.3f}s)")
+    print(f"heavy modules added: {', '.join(heavy) or 'none'}")
+
+    failed = False
+    if heavy:
+        print("FAIL: heavy libraries are imported while building the Definitions")
+        failed = True
+    if overhead > args.max_overhead:
+        print(f"FAIL: import overhead {overhead:.3f}s exceeds {args.max_overhead:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Check that lake compaction merges appended files and that stale manifest swaps are refused.
+
+Run from the etl_pipeline project directory, against the MinIO configured in the environment:
+
+    python benchmarks/lake_compaction.py --rows 10000
+
+A scratch table is written once and appended to once, which leaves two small files in its
+manifest. Compaction must merge them into one file with the same rows and the same content
+version, so committed state stays valid. A swap against the manifest version compaction
+replaced, and an append on top of content that moved on, must both raise ManifestConflict.
+The scratch table is removed afterwards. Exits non-zero on any failed check.
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from etl_pipeline import MINIO_CONFIG
+from etl_pipeline.resources.minio_io_manager import (
+    ManifestConflict,
+    MinIOIOManager,
+    connect_minio,
+    content_version,
+    new_version
+)
+
+MB = 1024 * 1024
+
+
+def frame(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"fingerprint": rng.integers(0, 2 ** 63, n_rows, dtype="int64").astype("uint64")})
+
+
+def conflicts(fn):
+    try:
+        fn()
+    except ManifestConflict:
+        return True
+    return False
+
+
+def remove_table(key_name):
+    bucket = MINIO_CONFIG.get("bucket")
+    with connect_minio(MINIO_CONFIG) as client:
+        for obj in client.list_objects(bucket, prefix=f"{key_name}/", recursive=True):
+            client.remove_object(bucket, obj.object_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    minio_io_manager = MinIOIOManager(MINIO_CONFIG)
+    key_name = f"maintenance/check/compaction_{new_version()}"
+    first, second = frame(args.rows, 0), frame(args.rows, 1)
+    checks = {}
+    try:
+        written = minio_io_manager.write_frame(key_name, first)
+        appended = minio_io_manager.append_frame(key_name, second, content_version(written))
+        checks["append adds a file"] = len(appended["files"]) == 2
+
+        result = minio_io_manager.compact_table(key_name, target_bytes=128 * MB, small_bytes=32 * MB)
+        compacted = minio_io_manager.read_manifest(key_name)
+        checks["two files compacted into one"] = result == {"compacted_files": 2, "new_files": 1} and len(compacted["files"]) == 1
+        checks["content version kept"] = content_version(compacted) == content_version(appended)
+        expected = pd.concat([first, second]).sort_values("fingerprint", ignore_index=True)
+        checks["rows kept"] = minio_io_manager.read_frame(key_name).sort_values("fingerprint", ignore_index=True).equals(expected)
+
+        checks["stale swap refused"] = conflicts(lambda: minio_io_manager.publish(key_name, [], expected_version=appended["version"]))
+        checks["stale append refused"] = conflicts(lambda: minio_io_manager.append_frame(key_name, second, content_version(written)))
+    finally:
+        remove_table(key_name)
+
+    for name, passed in checks.items():
+        print(f"{name:<30} {passed}")
+    failed = not all(checks.values())
+    if failed:
+        print("FAIL: lake compaction check failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
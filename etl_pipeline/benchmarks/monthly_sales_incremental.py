@@ -0,0 +1,146 @@
+"""Check the incremental monthly sales summary against a full rebuild on a split dataset.
+
+Run from the etl_pipeline project directory:
+
+    python benchmarks/monthly_sales_incremental.py --rows 200000
+
+A synthetic products_sales set is split into a first snapshot and a later one in three ways:
+rows of a few old months arriving late, as backfills do; rows of a few months changed or
+removed; and a new month appended with a handful of late rows. Each touches only some
+months, so a month the refresh misses shows up as a difference. The summary and per-month
+digests built from the first snapshot are round-tripped through parquet, as they are in the
+lake, and refreshed with the second snapshot; the result must equal a full rebuild. A product
+moving category must change the products digest. Exits non-zero on any mismatch.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl_pipeline.transforms.monthly_sales import (
+    month_ordinal,
+    summarise_monthly_sales,
+    refresh_monthly_sales,
+    month_digests,
+    changed_months,
+    summaries_match,
+    products_digest
+)
+
+CATEGORIES = ["bed_bath_table", "health_beauty", "sports_leisure", "furniture_decor", "computers_accessories",
+              "housewares", "watches_gifts", "telephony", "garden_tools", "auto", "toys", "cool_stuff"]
+
+
+def generate(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    n_products = max(n_rows // 20, 10)
+    categories = rng.choice(CATEGORIES, n_products).astype(object)
+    categories[rng.random(n_products) < 0.01] = None
+    products = pd.DataFrame({
+        "product_id": [f"p{i:07d}" for i in range(n_products)],
+        "product_category_name_english": categories
+    })
+
+    # two years of purchases, a few without a parsable timestamp
+    seconds = rng.integers(0, 2 * 365 * 24 * 3600, n_rows)
+    timestamps = (pd.Timestamp("2017-01-01") + pd.to_timedelta(seconds, unit="s")).strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+    timestamps[rng.random(n_rows) < 0.005] = None
+    price = rng.gamma(2.0, 50.0, n_rows).round(2)
+    products_sales = pd.DataFrame({
+        "order_id": [f"o{i:08d}" for i in range(n_rows)],
+        "product_id": products["product_id"].to_numpy()[rng.integers(0, n_products, n_rows)],
+        "order_purchase_timestamp": timestamps,
+        "price": price,
+        "total_sales_value": (price + rng.gamma(1.5, 10.0, n_rows)).round(2)
+    })
+    return products_sales, products
+
+
+def in_months(products_sales, months):
+    return np.isin(month_ordinal(products_sales["order_purchase_timestamp"]), months)
+
+
+def backfill_split(products_sales, rng):
+    # rows of three old months arrive only in the second snapshot
+    late = in_months(products_sales, [2017 * 12 + 1, 2017 * 12 + 6, 2018 * 12 + 3]) & (rng.random(len(products_sales)) < 0.3)
+    return products_sales[~late].reset_index(drop=True), products_sales
+
+
+def change_split(products_sales, rng):
+    # the second snapshot rescales rows of two months and drops rows of two others
+    second = products_sales.copy()
+    changed = in_months(second, [2017 * 12 + 3, 2018 * 12 + 8]) & (rng.random(len(second)) < 0.05)
+    second.loc[changed, "total_sales_value"] = (second.loc[changed, "total_sales_value"] * 1.1).round(2)
+    gone = in_months(second, [2017 * 12 + 9, 2018 * 12 + 0]) & (rng.random(len(second)) < 0.05)
+    return products_sales, second[~gone].reset_index(drop=True)
+
+
+def append_split(products_sales, rng):
+    # first snapshot: everything before the last month, less a handful of rows that arrive late
+    timestamps = pd.to_datetime(products_sales["order_purchase_timestamp"])
+    held_out = timestamps >= timestamps.max().to_period("M").start_time
+    held_out |= rng.random(len(products_sales)) < 20 / len(products_sales)
+    return products_sales[~held_out].reset_index(drop=True), products_sales
+
+
+SPLITS = {"backfill": backfill_split, "change": change_split, "append": append_split}
+
+
+def round_trip(df, directory, name):
+    path = os.path.join(directory, f"{name}.parquet")
+    df.to_parquet(path, index=False)
+    return pd.read_parquet(path)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    products_sales, products = generate(args.rows, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+
+    failed = False
+    for name, split in SPLITS.items():
+        first, second = split(products_sales, rng)
+        with tempfile.TemporaryDirectory() as directory:
+            summary = round_trip(summarise_monthly_sales(first, products), directory, "summary")
+            seen = round_trip(month_digests(first), directory, "month_digests")
+
+        expected, full_seconds = timed(lambda: summarise_monthly_sales(second, products))
+
+        def incremental():
+            touched = changed_months(seen, month_digests(second))
+            return refresh_monthly_sales(summary, second, products, touched), touched
+        (actual, touched), incremental_seconds = timed(incremental)
+
+        match = summaries_match(expected, actual)
+        failed |= not match
+        print(f"{name:<9} {len(second)} rows, {len(touched)} of {expected['sales_month'].nunique()} months touched: "
+              f"full {full_seconds:.3f}s, incremental {incremental_seconds:.3f}s, match {match}")
+
+    moved = products.copy()
+    moved.loc[0, "product_category_name_english"] = "moved_category"
+    digest_changes = products_digest(moved) != products_digest(products)
+    digest_stable = products_digest(products.sample(frac=1, random_state=args.seed)) == products_digest(products)
+    print(f"products digest changes with a category move {digest_changes}, ignores row order {digest_stable}")
+
+    failed |= not (digest_changes and digest_stable)
+    if failed:
+        print("FAIL: incremental monthly summary or products digest check failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
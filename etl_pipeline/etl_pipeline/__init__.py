@@ -1,6 +1,9 @@
 from dagster import Definitions
 import os
 from dotenv import load_dotenv
+# Loading the code location only builds the Definitions. pandas, pyarrow, polars and the
+# database and MinIO clients are imported inside the asset bodies and IO manager methods
+# that use them (see benchmarks/import_time.py).
 from .assets.bronze_layer import all_assets as bronze_assets
 from .assets.silver_layer import (
     silver_olist_products,
@@ -17,11 +20,17 @@ from .assets.gold_layer import (
     gold_customer_churn
 )
 from .assets.warehouse_layer import (
-    warehouse_transactions_with_order_items,
-    warehouse_monthly_product_sales_summary,
-    warehouse_customer_review_summary,
-    warehouse_customer_churn
+    per_table_assets as warehouse_per_table_assets,
+    coordinated_assets as warehouse_coordinated_assets
 )
+from .assets.serving_layer import serving_customer_lookup
+from .assets.maintenance_layer import (
+    maintenance_lake_compaction,
+    lake_maintenance_job,
+    lake_maintenance_schedule
+)
+from .checks import build_stats_checks
+from .execution import pipeline_executor
 from .resources.mysql_io_manager import MySQLIOManager
 from .resources.minio_io_manager import MinIOIOManager
 from .resources.psql_io_manager import PostgreSQLIOManager
@@ -52,7 +61,8 @@ PSQL_CONFIG = {
     "port": os.getenv("POSTGRES_PORT"),
     "database": os.getenv("POSTGRES_DB"),
     "user": os.getenv("POSTGRES_USER"),
-    "password": os.getenv("POSTGRES_PASSWORD")
+    "password": os.getenv("POSTGRES_PASSWORD"),
+    "pool_size": os.getenv("POSTGRES_POOL_SIZE", "4")
 }
 
 
@@ -74,19 +84,33 @@ gold_assets = [
 ]
 
 
-warehouse_assets = [
-    warehouse_transactions_with_order_items,
-    warehouse_monthly_product_sales_summary,
-    warehouse_customer_review_summary,
-    warehouse_customer_churn
+# "coordinated" loads all warehouse tables concurrently and publishes them together,
+# "per_table" materialises each warehouse table on its own
+if os.getenv("WAREHOUSE_LOAD_MODE", "per_table") == "coordinated":
+    warehouse_assets = warehouse_coordinated_assets
+else:
+    warehouse_assets = warehouse_per_table_assets
+
+
+serving_assets = [
+    serving_customer_lookup
+]
+
+
+maintenance_assets = [
+    maintenance_lake_compaction
 ]
 
 
-all_assets = bronze_assets + silver_assets + gold_assets + warehouse_assets
+all_assets = bronze_assets + silver_assets + gold_assets + warehouse_assets + serving_assets + maintenance_assets
 
 
 defs = Definitions(
     assets=all_assets,
+    asset_checks=build_stats_checks(silver_assets + gold_assets),
+    jobs=[lake_maintenance_job],
+    schedules=[lake_maintenance_schedule],
+    executor=pipeline_executor,
     resources={
         "mysql_io_manager": MySQLIOManager(MYSQL_CONFIG),
         "minio_io_manager": MinIOIOManager(MINIO_CONFIG),
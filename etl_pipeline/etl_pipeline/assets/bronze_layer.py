@@ -1,5 +1,5 @@
 from dagster import asset, Output
-import pandas as pd
+from ..execution import resource_tags
 
 tables = [
     "olist_order_items_dataset",
@@ -17,9 +17,10 @@ def create_asset(table):
         required_resource_keys={"mysql_io_manager"},
         key_prefix=["bronze", "ecom"],
         compute_kind="SQL",
-        group_name="bronze"
+        group_name="bronze",
+        op_tags=resource_tags("mysql")
     )
-    def _asset(context) -> Output[pd.DataFrame]:
+    def _asset(context) -> Output:
         sql_stm = f"SELECT * FROM {table}"
         pd_data = context.resources.mysql_io_manager.extract_data(sql_stm)
         context.log.info(f"Table extracted: {pd_data.shape}")
@@ -1,9 +1,11 @@
-import pandas as pd
-from dagster import asset, Output, AssetIn
-import pandasql as psql
+from dagster import asset, Output, AssetIn, Field, Enum, EnumValue
+from ..execution import resource_tags
+from ..transforms.churn import DEFAULT_CHURN_HORIZON_DAYS
+from .silver_layer import CUSTOMER_STATE_CONFIG
 
 @asset(
     description="Transaction with ordered items",
+    metadata={"primary_key": ["order_id"]},
     ins={
         "silver_olist_products": AssetIn(key_prefix=["silver", "ecom"]),
         "silver_olist_orders": AssetIn(key_prefix=["silver", "ecom"]),
@@ -12,34 +14,13 @@ import pandasql as psql
     required_resource_keys={"minio_io_manager"},
     key_prefix=["gold", "ecom"],
     group_name="gold",
-    compute_kind="Pandas"
+    compute_kind="Pandas",
+    op_tags=resource_tags("minio")
 )
-def gold_transactions_with_order_items(context, silver_olist_products: pd.DataFrame, silver_olist_orders: pd.DataFrame) -> Output[pd.DataFrame]:
-    query = """
-    WITH order_items AS (
-        SELECT 
-            soo.order_id,
-            sop.product_category_name_english
-        FROM
-            silver_olist_orders soo
-        JOIN
-            silver_olist_products sop
-        ON 
-            soo.product_id = sop.product_id
-    )
-    SELECT
-        order_id,
-        GROUP_CONCAT(product_category_name_english) AS list_of_products
-    FROM 
-        order_items
-    GROUP BY 
-        order_id
-    ORDER BY
-        order_id
-    """
-    transaction_summary = psql.sqldf(query, locals())
-
-    transaction_summary['list_of_products'] = transaction_summary['list_of_products'].str.strip()
+def gold_transactions_with_order_items(context, silver_olist_products, silver_olist_orders) -> Output:
+    from ..transforms.baskets import build_order_baskets
+
+    transaction_summary = build_order_baskets(silver_olist_orders, silver_olist_products)
 
     context.resources.minio_io_manager.handle_output(context, transaction_summary)
 
@@ -55,41 +36,83 @@ def gold_transactions_with_order_items(context, silver_olist_products: pd.DataFr
 
 @asset(
     description="Monthly product sales summary",
+    metadata={"primary_key": ["sales_month", "product_category"]},
     ins={
         "silver_olist_products_sales": AssetIn(key_prefix=["silver", "ecom"]),
         "silver_olist_products": AssetIn(key_prefix=["silver","ecom"]),
     },
+    config_schema={
+        "mode": Field(
+            Enum("MonthlySalesMode", [EnumValue("incremental"), EnumValue("full")]),
+            default_value="incremental",
+            description="Recompute only the months touched by new, changed or removed sales rows, or rebuild every month"
+        ),
+        "full_rebuild_every_n_runs": Field(
+            int,
+            default_value=30,
+            description="Force a full rebuild after this many incremental runs"
+        ),
+        "verify": Field(
+            bool,
+            default_value=False,
+            description="Also run a full rebuild and fall back to it if the incremental result differs"
+        )
+    },
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["gold", "ecom"],
     group_name="gold",
-    compute_kind="Pandas"
+    compute_kind="Pandas",
+    op_tags=resource_tags("minio")
 )
-def gold_monthly_product_sales_summary(context, silver_olist_products_sales: pd.DataFrame, silver_olist_products: pd.DataFrame) -> Output[pd.DataFrame]:
-    query = """
-    WITH monthly_sales AS (
-        SELECT
-            strftime('%Y-%m', s.order_purchase_timestamp) AS sales_month,
-            p.product_category_name_english AS product_category,
-            SUM(s.total_sales_value) AS total_sales_value,
-            SUM(s.price) AS total_products_sold
-        FROM silver_olist_products_sales s
-        JOIN silver_olist_products p ON s.product_id = p.product_id
-        GROUP BY sales_month, product_category
+def gold_monthly_product_sales_summary(context, silver_olist_products_sales, silver_olist_products) -> Output:
+    from ..transforms.customer_state import load_state, save_state
+    from ..transforms.monthly_sales import (
+        MONTHLY_SALES_STATE,
+        summarise_monthly_sales,
+        refresh_monthly_sales,
+        month_digests,
+        changed_months,
+        summaries_match,
+        products_digest
     )
-    SELECT 
-        sales_month,
-        product_category,
-        total_sales_value,
-        total_products_sold
-    FROM monthly_sales
-    ORDER BY sales_month, product_category
-    """
-    monthly_sales_summary = psql.sqldf(query, locals())
 
-    monthly_sales_summary['product_category'] = monthly_sales_summary['product_category'].str.strip()
+    config = context.op_config
+    minio_io_manager = context.resources.minio_io_manager
+    commit = minio_io_manager.read_json(MONTHLY_SALES_STATE["commit"]) or {}
+    runs_since_full_rebuild = commit.get("runs_since_full_rebuild", 0) + 1
+    current_months = month_digests(silver_olist_products_sales)
+    digest = products_digest(silver_olist_products)
 
-    context.resources.minio_io_manager.handle_output(context, monthly_sales_summary)
+    state = None
+    if config["mode"] == "incremental" and runs_since_full_rebuild < config["full_rebuild_every_n_runs"]:
+        state = load_state(minio_io_manager, MONTHLY_SALES_STATE)
+        # a product moving category rewrites months the sales rows do not point at
+        if state is not None and commit.get("products") != digest:
+            context.log.info("Products changed since the last run, rebuilding the monthly summary")
+            state = None
+
+    touched = None
+    if state is not None:
+        touched = changed_months(state["months"], current_months)
+        monthly_sales_summary = refresh_monthly_sales(state["summary"], silver_olist_products_sales, silver_olist_products, touched)
+        if config["verify"]:
+            full_summary = summarise_monthly_sales(silver_olist_products_sales, silver_olist_products)
+            if not summaries_match(full_summary, monthly_sales_summary):
+                context.log.warning("Incremental monthly summary differs from a full rebuild, using the full rebuild")
+                monthly_sales_summary = full_summary
+    else:
+        monthly_sales_summary = summarise_monthly_sales(silver_olist_products_sales, silver_olist_products)
+        runs_since_full_rebuild = 0
+
+    minio_io_manager.handle_output(context, monthly_sales_summary)
+    save_state(
+        minio_io_manager,
+        MONTHLY_SALES_STATE,
+        {"summary": monthly_sales_summary, "months": current_months},
+        products=digest,
+        runs_since_full_rebuild=runs_since_full_rebuild
+    )
 
     context.log.info(f"Data extracted with shape: {monthly_sales_summary.shape}")
     return Output(
@@ -97,48 +120,66 @@ def gold_monthly_product_sales_summary(context, silver_olist_products_sales: pd.
         metadata={
             "table": "gold_monthly_product_sales_summary",
             "rows": len(monthly_sales_summary),
-            "columns": list(monthly_sales_summary.columns)
+            "columns": list(monthly_sales_summary.columns),
+            "mode": "full" if touched is None else "incremental",
+            "recomputed_months": len(touched) if touched is not None else int(monthly_sales_summary["sales_month"].nunique())
         }
     )
 
 @asset(
     description="Customer review summary",
+    metadata={"primary_key": ["customer_id"]},
     ins={
         "silver_olist_reviews": AssetIn(key_prefix=["silver", "ecom"]),
         "silver_olist_orders": AssetIn(key_prefix=["silver", "ecom"])
     },
+    config_schema=CUSTOMER_STATE_CONFIG,
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["gold", "ecom"],
     group_name="gold",
-    compute_kind="Pandas"
+    compute_kind="Pandas",
+    op_tags=resource_tags("minio")
 )
-def gold_customer_review_summary(context, silver_olist_reviews: pd.DataFrame, silver_olist_orders: pd.DataFrame) -> Output[pd.DataFrame]:
-    query = """
-    WITH review_summary AS (
-        SELECT
-            DISTINCT soo.customer_id,
-            COUNT(DISTINCT soo.order_id) AS total_orders,
-            COUNT(sor.review_id) AS total_reviews,
-            AVG(sor.score) AS average_review_score,
-            SUM(soo.payment_value) AS total_spent
-        FROM silver_olist_orders soo
-        JOIN silver_olist_reviews sor ON sor.order_id = soo.order_id
-        GROUP BY soo.customer_id
+def gold_customer_review_summary(context, silver_olist_reviews, silver_olist_orders) -> Output:
+    import pandas as pd
+    from ..transforms.customer_state import (
+        REVIEW_SUMMARY_STATE,
+        load_state,
+        save_state,
+        empty_review_state,
+        update_review_state,
+        review_summary_from_state
     )
-    SELECT 
-        rs.customer_id,
-        rs.total_orders,
-        rs.total_reviews,
-        rs.average_review_score,
-        rs.total_spent
-    FROM review_summary rs
-    ORDER BY rs.customer_id
-    """
-
-    review_summary_df = psql.sqldf(query, locals())
-    review_summary_df['average_review_score'] = review_summary_df['average_review_score'].fillna(0)
-    review_summary_df['customer_id'] = review_summary_df['customer_id'].str.strip('"')
+
+    # Same figures as joining every order row with its reviews and aggregating per customer,
+    # kept as running per-order and per-customer sums so only unseen rows are folded in
+    config = context.op_config
+    minio_io_manager = context.resources.minio_io_manager
+    lookback = pd.Timedelta(days=config["lookback_days"])
+    commit = minio_io_manager.read_json(REVIEW_SUMMARY_STATE["commit"]) or {}
+    runs_since_full_rebuild = commit.get("runs_since_full_rebuild", 0) + 1
+    state = None
+    if config["mode"] == "incremental" and runs_since_full_rebuild < config["full_rebuild_every_n_runs"]:
+        state = load_state(minio_io_manager, REVIEW_SUMMARY_STATE)
+
+    mode = "incremental"
+    new_state, changed_orders = update_review_state(state, silver_olist_orders, silver_olist_reviews, lookback) if state is not None else (None, 0)
+    if new_state is None:
+        if state is not None:
+            context.log.warning("Rows seen before are gone from the silver tables, rebuilding the review summary state")
+        mode = "full"
+        runs_since_full_rebuild = 0
+        new_state, changed_orders = update_review_state(empty_review_state(), silver_olist_orders, silver_olist_reviews, lookback)
+    save_state(
+        minio_io_manager,
+        REVIEW_SUMMARY_STATE,
+        new_state,
+        previous=state if mode == "incremental" else None,
+        runs_since_full_rebuild=runs_since_full_rebuild
+    )
+
+    review_summary_df = review_summary_from_state(new_state)
 
     context.resources.minio_io_manager.handle_output(context, review_summary_df)
 
@@ -148,47 +189,40 @@ def gold_customer_review_summary(context, silver_olist_reviews: pd.DataFrame, si
         metadata={
             "table": "gold_customer_review_summary",
             "rows": len(review_summary_df),
-            "columns": list(review_summary_df.columns)
+            "columns": list(review_summary_df.columns),
+            "mode": mode,
+            "changed_orders": changed_orders
         }
     )
 @asset(
     description="Customer churn prediction",
+    metadata={"primary_key": ["customer_id"]},
     ins={
         "gold_customer_review_summary": AssetIn(key_prefix=["gold", "ecom"]),
         "silver_customer_last_purchase": AssetIn(key_prefix=["silver", "ecom"]),
     },
+    config_schema={
+        "churn_horizon_days": Field(
+            int,
+            default_value=DEFAULT_CHURN_HORIZON_DAYS,
+            description="Days without a purchase after which a customer counts as churned"
+        )
+    },
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["gold", "ecom"],
     group_name="gold",
-    compute_kind="Pandas"
+    compute_kind="Pandas",
+    op_tags=resource_tags("minio")
 )
-def gold_customer_churn(context, gold_customer_review_summary: pd.DataFrame, silver_customer_last_purchase: pd.DataFrame) -> Output[pd.DataFrame]:
-    silver_customer_last_purchase['last_purchase_timestamp'] = pd.to_datetime(silver_customer_last_purchase['last_purchase_timestamp'])
-    query = """
-    WITH last_order_date AS (
-        SELECT 
-            MAX(last_purchase_timestamp) AS last_date
-        FROM silver_customer_last_purchase
+def gold_customer_churn(context, gold_customer_review_summary, silver_customer_last_purchase) -> Output:
+    from ..transforms.churn import compute_customer_churn
+
+    churn_df = compute_customer_churn(
+        gold_customer_review_summary,
+        silver_customer_last_purchase,
+        horizon_days=context.op_config["churn_horizon_days"]
     )
-    SELECT
-        c.customer_id,
-        c.total_orders,
-        c.total_spent,
-        c.average_review_score,
-        l.last_purchase_timestamp,
-        CAST((julianday(o.last_date) - julianday(l.last_purchase_timestamp)) AS INTEGER) AS days_since_last_purchase,
-        CASE
-            WHEN (julianday(o.last_date) - julianday(l.last_purchase_timestamp)) > 180 THEN 1
-            ELSE 0
-        END AS churn
-    FROM
-        gold_customer_review_summary c
-    JOIN
-        silver_customer_last_purchase l ON c.customer_id = l.customer_id
-    CROSS JOIN last_order_date o
-    """
-    churn_df = psql.sqldf(query, locals())
 
     context.log.info(f"Data extracted with shape: {churn_df.shape}")
 
@@ -0,0 +1,71 @@
+from dagster import asset, Field, MaterializeResult, AssetSelection, define_asset_job, ScheduleDefinition
+from ..execution import resource_tags
+
+MB = 1024 * 1024
+
+@asset(
+    description="Compacts small parquet files in the data lake and expires superseded ones",
+    config_schema={
+        "target_file_mb": Field(
+            int,
+            default_value=128,
+            description="Size of the files small files are merged into"
+        ),
+        "small_file_mb": Field(
+            int,
+            default_value=32,
+            description="Files below this size are candidates for compaction"
+        ),
+        "retention_hours": Field(
+            int,
+            default_value=72,
+            description="Keep superseded files and local temp files at least this long"
+        )
+    },
+    required_resource_keys={"minio_io_manager"},
+    key_prefix=["maintenance", "ecom"],
+    group_name="maintenance",
+    compute_kind="PyArrow",
+    op_tags=resource_tags("minio")
+)
+def maintenance_lake_compaction(context) -> MaterializeResult:
+    from ..resources.minio_io_manager import sweep_tmp_files
+
+    config = context.op_config
+    minio_io_manager = context.resources.minio_io_manager
+    retention_seconds = config["retention_hours"] * 3600
+
+    compacted_files, new_files, expired = 0, 0, 0
+    for key_name in minio_io_manager.list_tables():
+        result = minio_io_manager.compact_table(
+            key_name,
+            target_bytes=config["target_file_mb"] * MB,
+            small_bytes=config["small_file_mb"] * MB
+        )
+        if result.get("skipped"):
+            context.log.info(f"{key_name} was rewritten during compaction, leaving it for the next run")
+        compacted_files += result["compacted_files"]
+        new_files += result.get("new_files", 0)
+        # superseded files stay readable for in-flight readers until the retention passes
+        expired += minio_io_manager.expire_superseded(key_name, retention_seconds)
+    swept = sweep_tmp_files(retention_seconds)
+
+    context.log.info(f"Compacted {compacted_files} files into {new_files}, expired {expired}, swept {swept} temp files")
+    return MaterializeResult(
+        metadata={
+            "compacted_files": compacted_files,
+            "new_files": new_files,
+            "expired_files": expired,
+            "swept_tmp_files": swept
+        }
+    )
+
+lake_maintenance_job = define_asset_job(
+    "lake_maintenance_job",
+    selection=AssetSelection.groups("maintenance")
+)
+
+lake_maintenance_schedule = ScheduleDefinition(
+    job=lake_maintenance_job,
+    cron_schedule="0 3 * * *"
+)
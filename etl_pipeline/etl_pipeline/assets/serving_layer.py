@@ -0,0 +1,43 @@
+import os
+import tempfile
+from dagster import asset, AssetIn, MaterializeResult
+from ..execution import resource_tags
+from ..resources.minio_io_manager import new_version
+
+@asset(
+    description="customer_id-indexed lookup store over churn and review summaries",
+    ins={
+        "gold_customer_churn": AssetIn(key_prefix=["gold", "ecom"]),
+        "gold_customer_review_summary": AssetIn(key_prefix=["gold", "ecom"])
+    },
+    required_resource_keys={"minio_io_manager"},
+    key_prefix=["serving", "ecom"],
+    group_name="serving",
+    compute_kind="NumPy",
+    op_tags=resource_tags("minio")
+)
+def serving_customer_lookup(context, gold_customer_churn, gold_customer_review_summary) -> MaterializeResult:
+    from ..serving.customer_lookup import STORE_FILES, STORE_PREFIX, LATEST_KEY, build_store
+
+    minio_io_manager = context.resources.minio_io_manager
+    version = new_version()
+    previous = minio_io_manager.read_json(LATEST_KEY)
+    with tempfile.TemporaryDirectory() as store_dir:
+        stats = build_store(gold_customer_churn, gold_customer_review_summary, store_dir)
+        for name in STORE_FILES:
+            minio_io_manager.write_file(f"{STORE_PREFIX}/{version}/{name}", os.path.join(store_dir, name))
+    # publish the new version only once every file is uploaded
+    minio_io_manager.write_json(LATEST_KEY, {"version": version, **stats})
+    # services still on the previous version keep it until their next refresh; older ones go
+    keep = [version] + ([previous["version"]] if previous else [])
+    expired = minio_io_manager.expire_versions(STORE_PREFIX, keep)
+
+    context.log.info(f"Customer lookup store {version} built with {stats['rows']} customers, expired {expired} old store files")
+    return MaterializeResult(
+        metadata={
+            "path": f"{STORE_PREFIX}/{version}",
+            "rows": stats["rows"],
+            "version": version,
+            "expired_files": expired
+        }
+    )
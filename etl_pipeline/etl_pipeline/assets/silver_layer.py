@@ -1,31 +1,68 @@
-from dagster import asset, Output, AssetIn
-import pandas as pd
+from dagster import asset, Output, AssetIn, Field, Enum, EnumValue
+from ..execution import resource_tags
+from ..transforms.dedup import TIE_BREAKS
+
+# Bronze inputs are handed over as local parquet files, so the silver plans
+# can scan only the columns they need instead of loading whole tables
+PATH_INPUT = {"load_as": "path"}
+
+REVIEW_KEY = ["review_id", "order_id"]
+
+CUSTOMER_STATE_CONFIG = {
+    "mode": Field(
+        Enum("CustomerStateMode", [EnumValue("incremental"), EnumValue("full")]),
+        default_value="incremental",
+        description="Fold only rows not seen before into the persisted customer state, or rebuild it from every row"
+    ),
+    "lookback_days": Field(
+        int,
+        default_value=90,
+        description="Rows purchased this many days before the latest purchase seen are still checked for changes; older ones count as settled"
+    ),
+    "full_rebuild_every_n_runs": Field(
+        int,
+        default_value=30,
+        description="Force a full rebuild after this many incremental runs, picking up changes to settled rows"
+    )
+}
+
+SPILL_CONFIG = {
+    "memory_budget_mb": Field(
+        int,
+        default_value=0,
+        description="0 runs the lazy in-memory plan; otherwise hash-partition the inputs to disk so each partition fits the budget"
+    ),
+    "spill_dir": Field(
+        str,
+        is_required=False,
+        description="Local directory for spilled partitions, defaults to the system temp directory"
+    )
+}
 
 @asset(
     description="Information related to products",
+    metadata={"primary_key": ["product_id"]},
     ins={
         "olist_products_dataset_asset": AssetIn(
-            key_prefix=["bronze", "ecom"]
+            key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
         ),
         "product_category_name_translation_asset": AssetIn(
-            key_prefix=["bronze", "ecom"]
+            key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
         )
     },
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["silver", "ecom"],
     group_name="silver",
-    compute_kind="Pandas"
+    compute_kind="Polars",
+    op_tags=resource_tags("minio")
 )
-def silver_olist_products(context, olist_products_dataset_asset: pd.DataFrame, product_category_name_translation_asset: pd.DataFrame) -> Output[pd.DataFrame]:
-    merged_df = pd.merge(
-        olist_products_dataset_asset,
-        product_category_name_translation_asset,
-        left_on="product_category_name",
-        right_on="product_category_name"
-    )[["product_id", "product_category_name_english"]]
+def silver_olist_products(context, olist_products_dataset_asset: str, product_category_name_translation_asset: str) -> Output:
+    from ..transforms.silver_plans import products_plan
 
-    
+    merged_df = products_plan(olist_products_dataset_asset, product_category_name_translation_asset).collect().to_pandas()
 
     context.log.info(f"Data extracted with shape: {merged_df.shape}")
     return Output(
@@ -41,32 +78,54 @@ def silver_olist_products(context, olist_products_dataset_asset: pd.DataFrame, p
     description="Information related to ordered items",
     ins={
         "olist_order_items_dataset_asset": AssetIn(
-            key_prefix=["bronze", "ecom"]
+            key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
         ),
         "olist_orders_dataset_asset": AssetIn(
-            key_prefix=["bronze", "ecom"]
+            key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
         ),
         "olist_order_payments_dataset_asset": AssetIn(
-            key_prefix=["bronze", "ecom"]
+            key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
         )
     },
+    config_schema=SPILL_CONFIG,
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["silver", "ecom"],
     group_name="silver",
-    compute_kind="Pandas"
+    compute_kind="Polars",
+    op_tags=resource_tags("minio")
 )
-def silver_olist_orders(context, olist_orders_dataset_asset: pd.DataFrame, olist_order_items_dataset_asset: pd.DataFrame, olist_order_payments_dataset_asset: pd.DataFrame) -> Output[pd.DataFrame]:
-    merged_df = pd.merge(
-        olist_order_items_dataset_asset,
+def silver_olist_orders(context, olist_orders_dataset_asset: str, olist_order_items_dataset_asset: str, olist_order_payments_dataset_asset: str) -> Output:
+    from ..transforms.silver_joins import spill_orders
+    from ..transforms.silver_plans import orders_plan
+
+    memory_budget_mb = context.op_config["memory_budget_mb"]
+    if memory_budget_mb > 0:
+        sink = spill_orders(
+            olist_orders_dataset_asset,
+            olist_order_items_dataset_asset,
+            olist_order_payments_dataset_asset,
+            memory_budget_mb,
+            context.op_config.get("spill_dir")
+        )
+        context.log.info(f"Data spilled with {sink.rows} rows to {sink.path}")
+        return Output(
+            sink.path,
+            metadata={
+                "table": "silver_olist_orders",
+                "rows": sink.rows,
+                "columns": sink.columns
+            }
+        )
+
+    merged_df = orders_plan(
         olist_orders_dataset_asset,
-        on="order_id"
-    )
-    merged_df = pd.merge(
-        merged_df,
-        olist_order_payments_dataset_asset,
-        on="order_id"
-    )[["order_id", "customer_id", "order_purchase_timestamp", "product_id", "payment_value", "order_status"]]
+        olist_order_items_dataset_asset,
+        olist_order_payments_dataset_asset
+    ).collect().to_pandas()
 
     context.log.info(f"Data extracted with shape: {merged_df.shape}")
     return Output(
@@ -80,23 +139,65 @@ def silver_olist_orders(context, olist_orders_dataset_asset: pd.DataFrame, olist
 
 @asset(
     description="Information related to ordered items",
+    metadata={"primary_key": REVIEW_KEY},
     ins={
         "olist_order_reviews_dataset_asset": AssetIn(
-            key_prefix=["bronze", "ecom"]
+            key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
+        ),
+    },
+    config_schema={
+        "tie_break": Field(
+            Enum("ReviewTieBreak", [EnumValue(rule) for rule in TIE_BREAKS]),
+            default_value="first",
+            description="Which row to keep when several share a (review_id, order_id) key"
+        ),
+        "batch_rows": Field(
+            int,
+            default_value=0,
+            description="0 deduplicates the whole table in memory; otherwise stream it in batches of this many rows (first tie-break only)"
         ),
+        "spill_dir": Field(
+            str,
+            is_required=False,
+            description="Local directory for the streamed output, defaults to the system temp directory"
+        )
     },
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["silver", "ecom"],
     group_name="silver",
-    compute_kind="Pandas"
+    compute_kind="Polars",
+    op_tags=resource_tags("minio")
 )
-def silver_olist_reviews(context, olist_order_reviews_dataset_asset: pd.DataFrame) -> Output[pd.DataFrame]:
-    reviews = olist_order_reviews_dataset_asset.copy()
-    reviews.drop(columns=['review_creation_date', 'review_answer_timestamp'], inplace=True)
-    reviews = reviews.dropna(subset=['review_comment_message'])
-    reviews.drop_duplicates(inplace=True)
-    reviews.rename(columns={'review_score': 'score', 'review_comment_title': 'title', 'review_comment_message': 'comment'}, inplace=True)
+def silver_olist_reviews(context, olist_order_reviews_dataset_asset: str) -> Output:
+    from ..transforms.dedup import deduplicate
+    from ..transforms.silver_joins import REVIEWS_RENAME, stream_reviews
+    from ..transforms.silver_plans import reviews_plan
+
+    batch_rows = context.op_config["batch_rows"]
+    if batch_rows > 0:
+        sink = stream_reviews(
+            olist_order_reviews_dataset_asset,
+            REVIEW_KEY,
+            context.op_config["tie_break"],
+            batch_rows,
+            context.op_config.get("spill_dir")
+        )
+        context.log.info(f"Data streamed with {sink.rows} rows to {sink.path}")
+        return Output(
+            sink.path,
+            metadata={
+                "table": "silver_olist_reviews",
+                "rows": sink.rows,
+                "columns": sink.columns
+            }
+        )
+
+    reviews = reviews_plan(olist_order_reviews_dataset_asset).collect().to_pandas()
+    reviews.rename(columns=REVIEWS_RENAME, inplace=True)
+    # Deduplicate on the declared key with a fixed-width fingerprint instead of hashing the comment text
+    reviews = deduplicate(reviews, REVIEW_KEY, context.op_config["tie_break"])
     context.log.info(f"Data extracted with shape: {reviews.shape}")
     return Output(
         reviews,
@@ -109,17 +210,21 @@ def silver_olist_reviews(context, olist_order_reviews_dataset_asset: pd.DataFram
 
 @asset(
     description="Dimension table for customers",
+    metadata={"primary_key": ["customer_id"]},
     ins={
-        "olist_orders_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"])
+        "olist_orders_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"], metadata=PATH_INPUT)
     },
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["silver", "ecom"],
     group_name="silver",
-    compute_kind="Pandas"
+    compute_kind="Polars",
+    op_tags=resource_tags("minio")
 )
-def silver_olist_customers(context, olist_orders_dataset_asset: pd.DataFrame) -> Output[pd.DataFrame]:
-    customers_df = olist_orders_dataset_asset[['customer_id']].drop_duplicates().reset_index(drop=True)
+def silver_olist_customers(context, olist_orders_dataset_asset: str) -> Output:
+    from ..transforms.silver_plans import customers_plan
+
+    customers_df = customers_plan(olist_orders_dataset_asset).collect().to_pandas()
 
     context.log.info(f"Data extracted with shape: {customers_df.shape}")
     return Output(
@@ -134,38 +239,51 @@ def silver_olist_customers(context, olist_orders_dataset_asset: pd.DataFrame) ->
 @asset(
     description="Fact table for product sales",
     ins={
-        "olist_order_items_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"]),
-        "olist_products_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"]),
-        "olist_orders_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"]),
-        "product_category_name_translation_asset": AssetIn(key_prefix=["bronze", "ecom"])
+        "olist_order_items_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"], metadata=PATH_INPUT),
+        "olist_products_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"], metadata=PATH_INPUT),
+        "olist_orders_dataset_asset": AssetIn(key_prefix=["bronze", "ecom"], metadata=PATH_INPUT),
+        "product_category_name_translation_asset": AssetIn(key_prefix=["bronze", "ecom"], metadata=PATH_INPUT)
     },
+    config_schema=SPILL_CONFIG,
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["silver", "ecom"],
     group_name="silver",
-    compute_kind="Pandas"
+    compute_kind="Polars",
+    op_tags=resource_tags("minio")
 )
-def silver_olist_products_sales(context, olist_order_items_dataset_asset: pd.DataFrame, olist_products_dataset_asset: pd.DataFrame, olist_orders_dataset_asset: pd.DataFrame, product_category_name_translation_asset: pd.DataFrame) -> Output[pd.DataFrame]:
-    product_sales_df = pd.merge(
+def silver_olist_products_sales(context, olist_order_items_dataset_asset: str, olist_products_dataset_asset: str, olist_orders_dataset_asset: str, product_category_name_translation_asset: str) -> Output:
+    import pandas as pd
+    from ..transforms.silver_joins import spill_products_sales
+    from ..transforms.silver_plans import products_sales_plan
+
+    memory_budget_mb = context.op_config["memory_budget_mb"]
+    if memory_budget_mb > 0:
+        sink = spill_products_sales(
+            olist_order_items_dataset_asset,
+            olist_products_dataset_asset,
+            olist_orders_dataset_asset,
+            pd.read_parquet(product_category_name_translation_asset),
+            memory_budget_mb,
+            context.op_config.get("spill_dir")
+        )
+        context.log.info(f"Data spilled with {sink.rows} rows to {sink.path}")
+        return Output(
+            sink.path,
+            metadata={
+                "table": "silver_olist_products_sales",
+                "rows": sink.rows,
+                "columns": sink.columns
+            }
+        )
+
+    product_sales_df = products_sales_plan(
         olist_order_items_dataset_asset,
         olist_products_dataset_asset,
-        on="product_id"
-    )
-    product_sales_df = pd.merge(
-        product_sales_df,
-        product_category_name_translation_asset,
-        on="product_category_name"
-    )
-    product_sales_df = pd.merge(
-        product_sales_df,
         olist_orders_dataset_asset,
-        on="order_id"
-    )[['order_id', 'product_id', 'product_category_name_english', 'price', 'freight_value', 'order_purchase_timestamp', 'order_status']]
-    
-    product_sales_df['total_sales_value'] = product_sales_df['price'] + product_sales_df['freight_value']
+        product_category_name_translation_asset
+    ).collect().to_pandas()
 
-    product_sales_df['product_id'] = product_sales_df['product_id'].str.strip('"')
-    
     context.log.info(f"Data extracted with shape: {product_sales_df.shape}")
     return Output(
         product_sales_df,
@@ -178,22 +296,59 @@ def silver_olist_products_sales(context, olist_order_items_dataset_asset: pd.Dat
 
 @asset(
     description="Recorded of the last purchase of customers",
+    metadata={"primary_key": ["customer_id"]},
     ins={
         "olist_orders_dataset_asset": AssetIn(
             key_prefix=["bronze", "ecom"],
+            metadata=PATH_INPUT
         )
     },
+    config_schema=CUSTOMER_STATE_CONFIG,
     io_manager_key="minio_io_manager",
     required_resource_keys={"minio_io_manager"},
     key_prefix=["silver", "ecom"],
     group_name="silver",
-    compute_kind="Pandas"
+    compute_kind="Polars",
+    op_tags=resource_tags("minio")
 )
-def silver_customer_last_purchase(context, olist_orders_dataset_asset: pd.DataFrame) -> Output[pd.DataFrame]:
-    last_purchase_df = olist_orders_dataset_asset.copy()
-    last_purchase_df['order_purchase_timestamp'] = pd.to_datetime(last_purchase_df['order_purchase_timestamp'])
-    last_purchase_df = last_purchase_df.groupby('customer_id')['order_purchase_timestamp'].max().reset_index()
-    last_purchase_df.rename(columns={'order_purchase_timestamp': 'last_purchase_timestamp'}, inplace=True)
+def silver_customer_last_purchase(context, olist_orders_dataset_asset: str) -> Output:
+    import pandas as pd
+    from ..transforms.silver_plans import purchases_plan
+    from ..transforms.customer_state import (
+        LAST_PURCHASE_STATE,
+        load_state,
+        save_state,
+        empty_purchase_state,
+        update_purchase_state
+    )
+
+    config = context.op_config
+    minio_io_manager = context.resources.minio_io_manager
+    purchases = purchases_plan(olist_orders_dataset_asset).collect().to_pandas()
+    lookback = pd.Timedelta(days=config["lookback_days"])
+    commit = minio_io_manager.read_json(LAST_PURCHASE_STATE["commit"]) or {}
+    runs_since_full_rebuild = commit.get("runs_since_full_rebuild", 0) + 1
+    state = None
+    if config["mode"] == "incremental" and runs_since_full_rebuild < config["full_rebuild_every_n_runs"]:
+        state = load_state(minio_io_manager, LAST_PURCHASE_STATE)
+
+    mode = "incremental"
+    new_state, new_rows = update_purchase_state(state, purchases, lookback) if state is not None else (None, 0)
+    if new_state is None:
+        if state is not None:
+            context.log.warning("Orders seen before are gone from the source, rebuilding the last purchase state")
+        mode = "full"
+        runs_since_full_rebuild = 0
+        new_state, new_rows = update_purchase_state(empty_purchase_state(), purchases, lookback)
+    save_state(
+        minio_io_manager,
+        LAST_PURCHASE_STATE,
+        new_state,
+        previous=state if mode == "incremental" else None,
+        runs_since_full_rebuild=runs_since_full_rebuild
+    )
+
+    last_purchase_df = new_state["customers"]
     context.log.info(f"Data extracted with shape: {last_purchase_df.shape}")
     
     return Output(
@@ -201,6 +356,8 @@ def silver_customer_last_purchase(context, olist_orders_dataset_asset: pd.DataFr
         metadata={
             "table": "silver_customer_last_purchase",
             "rows": len(last_purchase_df),
-            "columns": list(last_purchase_df.columns)
+            "columns": list(last_purchase_df.columns),
+            "mode": mode,
+            "new_rows": new_rows
         }
     )
@@ -1,5 +1,104 @@
-import pandas as pd
-from dagster import Output, AssetIn, AssetOut, multi_asset
+from dagster import Output, AssetIn, AssetOut, AssetKey, AssetSpec, MaterializeResult, multi_asset
+from ..execution import resource_tags
+
+# Physical design of the ecom warehouse tables, applied by the psql_io_manager on load
+
+TRANSACTIONS_WITH_ORDER_ITEMS = {
+    "columns": ["order_id", "list_of_products"],
+    "column_types": {
+        "order_id": "VARCHAR(64) NOT NULL",
+        "list_of_products": "TEXT[] NOT NULL"
+    },
+    "primary_keys": ["order_id"]
+}
+
+MONTHLY_PRODUCT_SALES_SUMMARY = {
+    "columns": ["sales_month", "product_category", "total_sales_value", "total_products_sold"],
+    "column_types": {
+        "sales_month": "DATE",
+        "product_category": "VARCHAR(64)",
+        "total_sales_value": "DOUBLE PRECISION NOT NULL",
+        "total_products_sold": "DOUBLE PRECISION NOT NULL"
+    },
+    "partition_by": "sales_month",
+    "indexes": [["sales_month"], ["product_category"]],
+    "materialized_views": [
+        {
+            "name": "mv_monthly_sales",
+            "query": """
+                SELECT sales_month, SUM(total_sales_value) AS total_sales_value, SUM(total_products_sold) AS total_products_sold
+                FROM {schema}.{table}
+                WHERE sales_month IS NOT NULL
+                GROUP BY sales_month
+            """,
+            "unique_key": ["sales_month"]
+        },
+        {
+            "name": "mv_category_sales",
+            "query": """
+                SELECT product_category, SUM(total_sales_value) AS total_sales_value, AVG(total_sales_value) AS average_sales_value
+                FROM {schema}.{table}
+                WHERE product_category IS NOT NULL
+                GROUP BY product_category
+            """,
+            "unique_key": ["product_category"]
+        },
+        {
+            # headline totals cover every row, including purchases without a parsable month
+            "name": "mv_sales_overview",
+            "query": """
+                SELECT 1 AS id, SUM(total_sales_value) AS total_sales_value, AVG(total_sales_value) AS average_sales_value
+                FROM {schema}.{table}
+            """,
+            "unique_key": ["id"]
+        }
+    ]
+}
+
+CUSTOMER_REVIEW_SUMMARY = {
+    "columns": ["customer_id", "total_orders", "total_reviews", "average_review_score", "total_spent"],
+    "column_types": {
+        "customer_id": "VARCHAR(64) NOT NULL",
+        "total_orders": "INT NOT NULL",
+        "total_reviews": "INT NOT NULL",
+        "average_review_score": "DOUBLE PRECISION NOT NULL",
+        # NULL when none of the customer's reviewed orders has a payment, as SUM gives in SQL
+        "total_spent": "DOUBLE PRECISION"
+    },
+    "primary_keys": ["customer_id"]
+}
+
+CUSTOMER_CHURN = {
+    "columns": ["customer_id", "total_orders", "total_spent", "average_review_score", "last_purchase_timestamp", "days_since_last_purchase", "churn"],
+    "column_types": {
+        "customer_id": "VARCHAR(64) NOT NULL",
+        "total_orders": "INT NOT NULL",
+        "total_spent": "DOUBLE PRECISION",
+        "average_review_score": "DOUBLE PRECISION NOT NULL",
+        "last_purchase_timestamp": "TIMESTAMP",
+        "days_since_last_purchase": "INT",
+        "churn": "INT NOT NULL"
+    },
+    "primary_keys": ["customer_id"],
+    "materialized_views": [
+        {
+            "name": "mv_customer_churn_overview",
+            "query": """
+                SELECT 1 AS id, COUNT(*) AS customers, AVG(average_review_score) AS average_review_score,
+                       AVG(churn::DOUBLE PRECISION) AS churn_rate, SUM(total_spent) AS total_spent
+                FROM {schema}.{table}
+            """,
+            "unique_key": ["id"]
+        }
+    ]
+}
+
+def _monthly_sales_for_load(monthly_sales):
+    import pandas as pd
+    # sales_month is the partition key, stored as the first day of the month
+    return monthly_sales.assign(
+        sales_month=pd.to_datetime(monthly_sales["sales_month"], format="%Y-%m", errors="coerce")
+    )
 
 @multi_asset(
     ins={
@@ -11,15 +110,14 @@ from dagster import Output, AssetIn, AssetOut, multi_asset
         "warehouse_transactions_with_order_items": AssetOut(
             io_manager_key="psql_io_manager",
             key_prefix=["warehouse","ecom"],
-            metadata={
-                "columns": ["order_id", "list_of_products"]
-            },
+            metadata=TRANSACTIONS_WITH_ORDER_ITEMS,
         ),
     },
     compute_kind="PostgresSQL",
-    group_name="warehouse"
+    group_name="warehouse",
+    op_tags=resource_tags("postgres")
 )
-def warehouse_transactions_with_order_items(gold_transactions_with_order_items: pd.DataFrame) -> Output[pd.DataFrame]:
+def warehouse_transactions_with_order_items(gold_transactions_with_order_items) -> Output:
     return Output(
             gold_transactions_with_order_items,
             metadata={
@@ -39,17 +137,17 @@ def warehouse_transactions_with_order_items(gold_transactions_with_order_items:
         "warehouse_monthly_product_sales_summary": AssetOut(
             io_manager_key="psql_io_manager",
             key_prefix=["warehouse", "ecom"],
-            metadata={
-                "columns": ["sales_month", "product_category", "total_sales_value", "total_products_sold"]
-            },
+            metadata=MONTHLY_PRODUCT_SALES_SUMMARY,
         ),
     },
     compute_kind="PostgresSQL",
-    group_name="warehouse"
+    group_name="warehouse",
+    op_tags=resource_tags("postgres")
 )
-def warehouse_monthly_product_sales_summary(gold_monthly_product_sales_summary: pd.DataFrame) -> Output[pd.DataFrame]:
+def warehouse_monthly_product_sales_summary(gold_monthly_product_sales_summary) -> Output:
+    monthly_sales = _monthly_sales_for_load(gold_monthly_product_sales_summary)
     return Output(
-            gold_monthly_product_sales_summary,
+            monthly_sales,
             metadata={
                 "schema": "ecom",
                 "table": "monthly_product_sales_summary",
@@ -68,15 +166,14 @@ def warehouse_monthly_product_sales_summary(gold_monthly_product_sales_summary:
         "warehouse_customer_review_summary": AssetOut(
             io_manager_key="psql_io_manager",
             key_prefix=["warehouse", "ecom"],
-            metadata={
-                "columns": ["customer_id", "total_orders","total_reviews", "average_review_score","total_spent"]
-            },
+            metadata=CUSTOMER_REVIEW_SUMMARY,
         ),
     },
     compute_kind="PostgresSQL",
-    group_name="warehouse"
+    group_name="warehouse",
+    op_tags=resource_tags("postgres")
 )
-def warehouse_customer_review_summary(gold_customer_review_summary: pd.DataFrame) -> Output[pd.DataFrame]:
+def warehouse_customer_review_summary(gold_customer_review_summary) -> Output:
     return Output(
             gold_customer_review_summary,
             metadata={
@@ -97,15 +194,14 @@ def warehouse_customer_review_summary(gold_customer_review_summary: pd.DataFrame
         "warehouse_customer_churn": AssetOut(
             io_manager_key="psql_io_manager",
             key_prefix=["warehouse", "ecom"],
-            metadata={
-                "columns": ["customer_id", "total_orders", "total_spent", "average_review_score", "last_purchase_timestamp", "days_since_last_purchase", "churn"]
-            },
+            metadata=CUSTOMER_CHURN,
         ),
     },
     compute_kind="PostgresSQL",
-    group_name="warehouse"
+    group_name="warehouse",
+    op_tags=resource_tags("postgres")
 )
-def warehouse_customer_churn(gold_customer_churn: pd.DataFrame) -> Output[pd.DataFrame]:
+def warehouse_customer_churn(gold_customer_churn) -> Output:
     return Output(
             gold_customer_churn,
             metadata={
@@ -115,3 +211,58 @@ def warehouse_customer_churn(gold_customer_churn: pd.DataFrame) -> Output[pd.Dat
                 "columns": list(gold_customer_churn.columns)
             }
     )
+
+WAREHOUSE_TABLES = {
+    "warehouse_transactions_with_order_items": ("gold_transactions_with_order_items", TRANSACTIONS_WITH_ORDER_ITEMS),
+    "warehouse_monthly_product_sales_summary": ("gold_monthly_product_sales_summary", MONTHLY_PRODUCT_SALES_SUMMARY),
+    "warehouse_customer_review_summary": ("gold_customer_review_summary", CUSTOMER_REVIEW_SUMMARY),
+    "warehouse_customer_churn": ("gold_customer_churn", CUSTOMER_CHURN)
+}
+
+@multi_asset(
+    ins={
+        gold_name: AssetIn(key_prefix=["gold", "ecom"])
+        for gold_name, _ in WAREHOUSE_TABLES.values()
+    },
+    specs=[
+        AssetSpec(
+            key=AssetKey(["warehouse", "ecom", table]),
+            metadata=spec,
+            group_name="warehouse"
+        )
+        for table, (_, spec) in WAREHOUSE_TABLES.items()
+    ],
+    required_resource_keys={"psql_io_manager"},
+    compute_kind="PostgresSQL",
+    op_tags=resource_tags("postgres")
+)
+def warehouse_coordinated_load(context, gold_transactions_with_order_items, gold_monthly_product_sales_summary, gold_customer_review_summary, gold_customer_churn):
+    frames = {
+        "gold_transactions_with_order_items": gold_transactions_with_order_items,
+        "gold_monthly_product_sales_summary": _monthly_sales_for_load(gold_monthly_product_sales_summary),
+        "gold_customer_review_summary": gold_customer_review_summary,
+        "gold_customer_churn": gold_customer_churn
+    }
+    row_counts = context.resources.psql_io_manager.load_tables([
+        ("ecom", table, spec, frames[gold_name])
+        for table, (gold_name, spec) in WAREHOUSE_TABLES.items()
+    ])
+    for table in WAREHOUSE_TABLES:
+        yield MaterializeResult(
+            asset_key=AssetKey(["warehouse", "ecom", table]),
+            metadata={
+                "schema": "ecom",
+                "table": table,
+                "records_count": row_counts[table]
+            }
+        )
+
+
+per_table_assets = [
+    warehouse_transactions_with_order_items,
+    warehouse_monthly_product_sales_summary,
+    warehouse_customer_review_summary,
+    warehouse_customer_churn
+]
+
+coordinated_assets = [warehouse_coordinated_load]
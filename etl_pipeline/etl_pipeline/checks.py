@@ -0,0 +1,125 @@
+from dagster import asset_check, AssetCheckResult, AssetKey
+
+# Data-quality expectations for the silver and gold tables. They are evaluated against the
+# statistics sidecar MinIOIOManager writes next to each table, so no check rereads the data.
+# Key uniqueness is checked for the primary_key declared in each asset's metadata.
+STATS_EXPECTATIONS = {
+    ("silver", "ecom", "silver_olist_products"): {
+        "not_null": ["product_id"]
+    },
+    ("silver", "ecom", "silver_olist_orders"): {
+        "not_null": ["order_id", "customer_id", "product_id"],
+        "value_ranges": {"payment_value": (0, None)}
+    },
+    ("silver", "ecom", "silver_olist_reviews"): {
+        "not_null": ["review_id", "order_id", "comment"],
+        "value_ranges": {"score": (1, 5)}
+    },
+    ("silver", "ecom", "silver_olist_customers"): {
+        "not_null": ["customer_id"]
+    },
+    ("silver", "ecom", "silver_olist_products_sales"): {
+        "not_null": ["order_id", "product_id"],
+        "value_ranges": {"price": (0, None), "freight_value": (0, None), "total_sales_value": (0, None)}
+    },
+    ("silver", "ecom", "silver_customer_last_purchase"): {
+        "not_null": ["customer_id"]
+    },
+    ("gold", "ecom", "gold_transactions_with_order_items"): {
+        "not_null": ["order_id"]
+    },
+    ("gold", "ecom", "gold_monthly_product_sales_summary"): {
+        "max_null_rate": {"sales_month": 0.01},
+        "value_ranges": {"total_sales_value": (0, None)}
+    },
+    ("gold", "ecom", "gold_customer_review_summary"): {
+        "not_null": ["customer_id"],
+        "value_ranges": {"average_review_score": (0, 5), "total_orders": (1, None)}
+    },
+    ("gold", "ecom", "gold_customer_churn"): {
+        "not_null": ["customer_id"],
+        "value_ranges": {"churn": (0, 1)}
+    }
+}
+
+
+def _missing_stats(asset_key_path) -> AssetCheckResult:
+    return AssetCheckResult(passed=False, metadata={"reason": f"no statistics stored for {'/'.join(asset_key_path)}"})
+
+
+def stats_checks(asset_key_path, primary_key=None, min_rows=1, not_null=(), max_null_rate=None, value_ranges=None) -> list:
+    asset_key = AssetKey(list(asset_key_path))
+    null_limits = {**{column: 0.0 for column in not_null}, **(max_null_rate or {})}
+    value_ranges = value_ranges or {}
+
+    @asset_check(asset=asset_key, name="row_count", required_resource_keys={"minio_io_manager"})
+    def row_count(context) -> AssetCheckResult:
+        stats = context.resources.minio_io_manager.read_stats(asset_key_path)
+        if stats is None:
+            return _missing_stats(asset_key_path)
+        return AssetCheckResult(
+            passed=stats["rows"] >= min_rows,
+            metadata={"rows": stats["rows"], "min_rows": min_rows}
+        )
+
+    @asset_check(asset=asset_key, name="null_rate", required_resource_keys={"minio_io_manager"})
+    def null_rate(context) -> AssetCheckResult:
+        stats = context.resources.minio_io_manager.read_stats(asset_key_path)
+        if stats is None:
+            return _missing_stats(asset_key_path)
+        rates, failed = {}, []
+        for column, limit in null_limits.items():
+            nulls = stats["columns"].get(column, {}).get("nulls")
+            if nulls is None:
+                failed.append(column)
+                continue
+            rates[column] = nulls / stats["rows"] if stats["rows"] else 0.0
+            if rates[column] > limit:
+                failed.append(column)
+        return AssetCheckResult(passed=not failed, metadata={"null_rates": rates, "failed_columns": failed})
+
+    @asset_check(asset=asset_key, name="key_uniqueness", required_resource_keys={"minio_io_manager"})
+    def key_uniqueness(context) -> AssetCheckResult:
+        stats = context.resources.minio_io_manager.read_stats(asset_key_path)
+        if stats is None:
+            return _missing_stats(asset_key_path)
+        keys = stats.get("keys")
+        if keys is None:
+            return AssetCheckResult(passed=False, metadata={"reason": f"no key statistics for {primary_key}"})
+        return AssetCheckResult(
+            passed=keys["duplicates"] == 0,
+            metadata={"key": keys["columns"], "duplicates": keys["duplicates"]}
+        )
+
+    @asset_check(asset=asset_key, name="value_range", required_resource_keys={"minio_io_manager"})
+    def value_range(context) -> AssetCheckResult:
+        stats = context.resources.minio_io_manager.read_stats(asset_key_path)
+        if stats is None:
+            return _missing_stats(asset_key_path)
+        observed, failed = {}, []
+        for column, (low, high) in value_ranges.items():
+            column_stats = stats["columns"].get(column, {})
+            observed[column] = [column_stats.get("min"), column_stats.get("max")]
+            if column_stats.get("min") is None or column_stats.get("max") is None:
+                failed.append(column)
+            elif (low is not None and column_stats["min"] < low) or (high is not None and column_stats["max"] > high):
+                failed.append(column)
+        return AssetCheckResult(passed=not failed, metadata={"observed": observed, "failed_columns": failed})
+
+    checks = [row_count]
+    if null_limits:
+        checks.append(null_rate)
+    if primary_key:
+        checks.append(key_uniqueness)
+    if value_ranges:
+        checks.append(value_range)
+    return checks
+
+
+def build_stats_checks(assets) -> list:
+    checks = []
+    for asset_def in assets:
+        primary_key = asset_def.metadata_by_key.get(asset_def.key, {}).get("primary_key")
+        expectations = STATS_EXPECTATIONS.get(tuple(asset_def.key.path), {})
+        checks += stats_checks(asset_def.key.path, primary_key=primary_key, **expectations)
+    return checks
@@ -0,0 +1,30 @@
+import os
+from dagster import multiprocess_executor
+
+# Ops declare the backing service they load from or write to under this tag. The executor
+# throttles steps per value inside a run; instance-wide limits for the same keys are set with
+# `dagster instance concurrency set <key> <limit>` (see `make concurrency_limits`).
+CONCURRENCY_KEY_TAG = "dagster/concurrency_key"
+
+
+def resource_tags(resource: str) -> dict:
+    return {CONCURRENCY_KEY_TAG: resource}
+
+
+def _limit(name: str, default: int) -> int:
+    return int(os.getenv(name) or default)
+
+
+HOST_CPUS = os.cpu_count() or 1
+
+pipeline_executor = multiprocess_executor.configured(
+    {
+        "max_concurrent": _limit("PIPELINE_MAX_CONCURRENT", HOST_CPUS),
+        "tag_concurrency_limits": [
+            {"key": CONCURRENCY_KEY_TAG, "value": "mysql", "limit": _limit("MYSQL_MAX_CONCURRENCY", 2)},
+            {"key": CONCURRENCY_KEY_TAG, "value": "minio", "limit": _limit("MINIO_MAX_CONCURRENCY", HOST_CPUS)},
+            {"key": CONCURRENCY_KEY_TAG, "value": "postgres", "limit": _limit("POSTGRES_MAX_CONCURRENCY", 2)}
+        ]
+    },
+    name="pipeline_executor"
+)
@@ -0,0 +1,475 @@
+from __future__ import annotations
+
+import atexit
+import io
+import json
+import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Optional, Union
+
+from dagster import IOManager, InputContext, OutputContext
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# A table lives under {layer}/{schema}/{table}/ as one or more parquet files. The live files are
+# listed in _manifest.json, which is replaced with a single PUT, so readers always switch between
+# complete versions. Appends add files to the manifest, which the lake compaction job merges;
+# files that drop out of the manifest are expired by the same job.
+MANIFEST_NAME = "_manifest.json"
+# Column statistics gathered while the table was written, evaluated by the asset checks
+STATS_NAME = "_stats.json"
+# Objects next to the data files that are never expired
+SIDECAR_NAMES = {MANIFEST_NAME, STATS_NAME}
+TMP_DIR = os.path.join(tempfile.gettempdir(), "minio-io-manager")
+# An append racing the compaction job re-reads the manifest and tries again this many times
+APPEND_ATTEMPTS = 3
+
+
+class ManifestConflict(RuntimeError):
+    # The manifest moved on between reading it and swapping in a new version
+    pass
+
+
+@contextmanager
+def connect_minio(config):
+    from minio import Minio
+    client = Minio(
+        endpoint=config.get("endpoint_url"),
+        access_key=config.get("aws_access_key_id"),
+        secret_key=config.get("aws_secret_access_key"),
+        secure=False   
+    )
+    try:
+        yield client
+    except Exception:
+        raise
+
+def _nested_types_mapper(arrow_type):
+    import pandas as pd
+    import pyarrow as pa
+    # Keep list columns Arrow-backed instead of object columns of numpy arrays
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+def _to_pandas(table) -> pd.DataFrame:
+    # The pandas metadata names Arrow list columns "list<item: ...>[pyarrow]", which pandas
+    # cannot parse back into a dtype; let the types mapper rebuild them instead
+    metadata = table.schema.pandas_metadata
+    if metadata:
+        nested = [c for c in metadata["columns"] if str(c.get("numpy_type", "")).startswith(("list<", "large_list<"))]
+        for column in nested:
+            column["numpy_type"] = "object"
+        if nested:
+            table = table.replace_schema_metadata({**table.schema.metadata, b"pandas": json.dumps(metadata).encode()})
+    return table.to_pandas(types_mapper=_nested_types_mapper)
+
+def read_parquet(source) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+    return _to_pandas(pq.read_table(source))
+
+def read_parquet_files(paths: List[str]) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if len(paths) == 1:
+        return read_parquet(paths[0])
+    return _to_pandas(pa.concat_tables([pq.read_table(path) for path in paths], promote_options="default"))
+
+def merge_parquet_files(paths: List[str], target_bytes: Optional[int] = None) -> List[str]:
+    # Stream row groups of several files into new local files of roughly target_bytes each
+    import pyarrow.parquet as pq
+    outputs, writer, written = [], None, 0
+    try:
+        for path in paths:
+            source = pq.ParquetFile(path)
+            for i in range(source.num_row_groups):
+                if writer is None:
+                    outputs.append(tmp_file())
+                    writer = pq.ParquetWriter(outputs[-1], source.schema_arrow)
+                    written = 0
+                writer.write_table(source.read_row_group(i).cast(writer.schema))
+                written += source.metadata.row_group(i).total_byte_size
+                if target_bytes and written >= target_bytes:
+                    writer.close()
+                    writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+    return outputs
+
+def tmp_file(suffix: str = ".parquet") -> str:
+    os.makedirs(TMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=TMP_DIR)
+    os.close(fd)
+    return path
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def sweep_tmp_files(max_age_seconds: float) -> int:
+    # Leftovers of processes that died before cleaning up their temp files; drop the old ones
+    if not os.path.isdir(TMP_DIR):
+        return 0
+    removed = 0
+    now = time.time()
+    for name in os.listdir(TMP_DIR):
+        path = os.path.join(TMP_DIR, name)
+        if now - os.path.getmtime(path) > max_age_seconds:
+            os.remove(path)
+            removed += 1
+    return removed
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def parquet_stats(path: str, key_columns: Optional[List[str]] = None) -> dict:
+    # Row count, null counts and min/max per column come from the footer the writer just
+    # produced; only the declared key columns are read back, to count duplicate keys
+    import pyarrow.parquet as pq
+    metadata = pq.read_metadata(path)
+    columns = {}
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for i in range(row_group.num_columns):
+            chunk = row_group.column(i)
+            name = chunk.path_in_schema
+            # nested leaves (list elements) and the pandas index are not table columns
+            if "." in name or name.startswith("__index_level_"):
+                continue
+            entry = columns.setdefault(name, {"nulls": 0, "min": None, "max": None})
+            stats = chunk.statistics
+            if stats is None or not stats.has_null_count:
+                entry["nulls"] = None
+            elif entry["nulls"] is not None:
+                entry["nulls"] += stats.null_count
+            if stats is not None and stats.has_min_max:
+                entry["min"] = stats.min if entry["min"] is None else min(entry["min"], stats.min)
+                entry["max"] = stats.max if entry["max"] is None else max(entry["max"], stats.max)
+
+    result = {
+        "rows": metadata.num_rows,
+        "columns": {
+            name: {field: _json_value(value) for field, value in entry.items()}
+            for name, entry in columns.items()
+        }
+    }
+    if key_columns:
+        keys = pq.read_table(path, columns=key_columns)
+        distinct = keys.group_by(key_columns).aggregate([]).num_rows
+        result["keys"] = {"columns": key_columns, "duplicates": metadata.num_rows - distinct}
+    return result
+
+def content_version(manifest: dict) -> str:
+    # Manifests written before compaction kept the content version have only a version
+    return manifest.get("content_version", manifest["version"])
+
+def new_version() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f") + "-" + uuid.uuid4().hex[:8]
+
+class MinIOIOManager(IOManager):
+    def __init__(self, config):
+        self._config= config
+        # Local files handed to the running step as load_as=path inputs. Steps run one at a
+        # time in a process, so they are removed once the step has stored its output, or when
+        # the process exits after a failed step.
+        self._path_inputs = []
+        atexit.register(self._remove_path_inputs)
+    
+    def _get_key(self, asset_key_path):
+        layer, schema, table = asset_key_path
+        return "/".join([layer, schema, table.replace(f"{layer}_", "")])
+
+    def _get_path(self, context: Union[InputContext, OutputContext]):
+        # if context.has_asset_partitions:
+        #     start, end = context.asset_partitions_time_window
+        #     dt_format = "%Y%m%d%H%M%S"
+        #     partition_str = start.strftime(dt_format) + "_" + end.strftime(dt_format)
+        #     return os.path.join(key, f"{partition_str}.pq")
+        # else:
+        return self._get_key(context.asset_key.path)
+
+    def _remove_path_inputs(self):
+        remove_files(self._path_inputs)
+        self._path_inputs = []
+    
+    def handle_output(self, context: OutputContext, obj: Union[pd.DataFrame, str]):
+        key_name = self._get_path(context)
+        if isinstance(obj, str):
+            # already encoded as a local parquet file (spilled silver joins)
+            tmp_file_path = obj
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # convert to parquet format
+            tmp_file_path = tmp_file()
+            table = pa.Table.from_pandas(obj)
+            pq.write_table(table, tmp_file_path)
+
+        # upload to MinIO
+        try:
+            # keys are declared as asset metadata, which only the IO manager's own context carries
+            key_columns = (context.metadata or {}).get("primary_key") if isinstance(context, OutputContext) else None
+            stats = parquet_stats(tmp_file_path, key_columns)
+            manifest = self.publish(key_name, [tmp_file_path])
+            self.write_json(f"{key_name}/{STATS_NAME}", {"version": manifest["version"], **stats})
+            context.add_output_metadata({"path": key_name, "version": manifest["version"], "stats_rows": stats["rows"]})
+        finally:
+            # clean up tmp file and the inputs the step read from local files
+            remove_files([tmp_file_path])
+            self._remove_path_inputs()
+
+    def load_input(self, context: InputContext) -> Union[pd.DataFrame, str]:
+        key_name = self._get_path(context)
+        local_paths = self._download(key_name)
+        if local_paths is None:
+            raise FileNotFoundError(f"No data stored under {key_name}")
+        if (context.metadata or {}).get("load_as") == "path":
+            # the asset streams the local file itself
+            if len(local_paths) > 1:
+                merged = merge_parquet_files(local_paths)
+                remove_files(local_paths)
+                local_paths = merged
+            self._path_inputs.append(local_paths[0])
+            return local_paths[0]
+        try:
+            return read_parquet_files(local_paths)
+        finally:
+            remove_files(local_paths)
+
+    def read_frame(self, key_name: str) -> Optional[pd.DataFrame]:
+        local_paths = self._download(key_name)
+        if local_paths is None:
+            return None
+        try:
+            return read_parquet_files(local_paths)
+        finally:
+            remove_files(local_paths)
+
+    def write_frame(self, key_name: str, obj: pd.DataFrame) -> dict:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tmp_file_path = tmp_file()
+        try:
+            pq.write_table(pa.Table.from_pandas(obj), tmp_file_path)
+            return self.publish(key_name, [tmp_file_path])
+        finally:
+            remove_files([tmp_file_path])
+
+    def read_stats(self, asset_key_path) -> Optional[dict]:
+        return self.read_json(f"{self._get_key(asset_key_path)}/{STATS_NAME}")
+
+    def read_manifest(self, key_name: str) -> Optional[dict]:
+        return self.read_json(f"{key_name}/{MANIFEST_NAME}")
+
+    def append_frame(self, key_name: str, obj: pd.DataFrame, base_version: str) -> dict:
+        # Add obj to the table as one more file, on top of the content committed as base_version;
+        # the lake compaction job merges the small files that appends leave behind
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tmp_file_path = tmp_file()
+        try:
+            pq.write_table(pa.Table.from_pandas(obj), tmp_file_path)
+            version = new_version()
+            uploaded = self._upload(key_name, version, [tmp_file_path])
+        finally:
+            remove_files([tmp_file_path])
+        for _ in range(APPEND_ATTEMPTS):
+            manifest = self.read_manifest(key_name)
+            if manifest is None or content_version(manifest) != base_version:
+                raise ManifestConflict(f"{key_name} was rewritten since version {base_version}, appending would mix contents")
+            try:
+                return self._swap_manifest(key_name, version, manifest["files"] + uploaded, expected_version=manifest["version"])
+            except ManifestConflict:
+                # compacted meanwhile: same content in other files, append to those instead
+                continue
+        raise ManifestConflict(f"{key_name} kept changing while appending to version {base_version}")
+
+    def publish(self, key_name: str, local_paths: List[str], files: Optional[List[dict]] = None, expected_version: Optional[str] = None, **extra) -> dict:
+        # Upload the local files as a new version of the table, then swap the manifest;
+        # files are already-stored entries carried over into the new version
+        version = new_version()
+        uploaded = self._upload(key_name, version, local_paths)
+        return self._swap_manifest(key_name, version, (files or []) + uploaded, expected_version, **extra)
+
+    def _upload(self, key_name: str, version: str, local_paths: List[str]) -> List[dict]:
+        import pyarrow.parquet as pq
+        uploaded = []
+        with connect_minio(self._config) as client:
+            self._ensure_bucket(client)
+            for i, path in enumerate(local_paths):
+                object_name = f"{key_name}/part-{version}-{i:03d}.parquet"
+                client.fput_object(self._config.get("bucket"), object_name, path)
+                uploaded.append({
+                    "key": object_name,
+                    "size": os.path.getsize(path),
+                    "rows": pq.read_metadata(path).num_rows
+                })
+        return uploaded
+
+    def _swap_manifest(self, key_name: str, version: str, files: List[dict], expected_version: Optional[str] = None, **extra) -> dict:
+        # With expected_version the current manifest is compared right before the PUT, so a
+        # version published meanwhile raises ManifestConflict instead of being rolled back.
+        # content_version only changes when the rows do; compaction carries the old one over.
+        if expected_version is not None:
+            current = self.read_manifest(key_name)
+            if current is None or current["version"] != expected_version:
+                raise ManifestConflict(f"{key_name} moved on from version {expected_version}")
+        manifest = {
+            "version": version,
+            "content_version": extra.pop("content_version", version),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "files": files,
+            **extra
+        }
+        self.write_json(f"{key_name}/{MANIFEST_NAME}", manifest)
+        return manifest
+
+    def read_json(self, key_name: str) -> Optional[dict]:
+        data = self._get_object(key_name)
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def write_json(self, key_name: str, obj: dict):
+        data = json.dumps(obj).encode("utf-8")
+        with connect_minio(self._config) as client:
+            client.put_object(
+                self._config.get("bucket"),
+                key_name,
+                io.BytesIO(data),
+                length=len(data),
+                content_type="application/json"
+            )
+
+    def write_file(self, key_name: str, file_path: str):
+        with connect_minio(self._config) as client:
+            client.fput_object(self._config.get("bucket"), key_name, file_path)
+
+    def list_tables(self) -> List[str]:
+        suffix = f"/{MANIFEST_NAME}"
+        with connect_minio(self._config) as client:
+            return sorted(
+                obj.object_name[:-len(suffix)]
+                for obj in client.list_objects(self._config.get("bucket"), recursive=True)
+                if obj.object_name.endswith(suffix)
+            )
+
+    def compact_table(self, key_name: str, target_bytes: int, small_bytes: int) -> dict:
+        # Merge the manifest's small files into right-sized ones and swap the manifest
+        manifest = self.read_manifest(key_name)
+        if manifest is None:
+            return {"compacted_files": 0}
+        small = [f for f in manifest["files"] if f["size"] < small_bytes]
+        if len(small) < 2:
+            return {"compacted_files": 0}
+
+        downloads = [tmp_file() for _ in small]
+        merged = []
+        try:
+            with connect_minio(self._config) as client:
+                for f, path in zip(small, downloads):
+                    client.fget_object(self._config.get("bucket"), f["key"], path)
+            merged = merge_parquet_files(downloads, target_bytes)
+
+            small_keys = {f["key"] for f in small}
+            kept = [f for f in manifest["files"] if f["key"] not in small_keys]
+            try:
+                self.publish(
+                    key_name,
+                    merged,
+                    files=kept,
+                    expected_version=manifest["version"],
+                    content_version=content_version(manifest),
+                    compacted_from=manifest["version"]
+                )
+            except ManifestConflict:
+                # a writer published a new version meanwhile; its manifest wins
+                return {"compacted_files": 0, "skipped": True}
+        finally:
+            remove_files(downloads + merged)
+        return {"compacted_files": len(small), "new_files": len(merged)}
+
+    def expire_superseded(self, key_name: str, retention_seconds: float) -> int:
+        # Delete data files no longer referenced by the manifest once they are older than the retention
+        manifest = self.read_manifest(key_name)
+        if manifest is None:
+            return 0
+        live = {f["key"] for f in manifest["files"]}
+        now = datetime.now(timezone.utc)
+        bucket = self._config.get("bucket")
+        expired = 0
+        with connect_minio(self._config) as client:
+            # the pre-manifest single-object layout counts as a superseded copy
+            candidates = list(client.list_objects(bucket, prefix=f"{key_name}/", recursive=True))
+            candidates += [obj for obj in client.list_objects(bucket, prefix=f"{key_name}.pq") if obj.object_name == f"{key_name}.pq"]
+            for obj in candidates:
+                if obj.object_name in live or obj.object_name.rsplit("/", 1)[-1] in SIDECAR_NAMES:
+                    continue
+                if (now - obj.last_modified).total_seconds() > retention_seconds:
+                    client.remove_object(bucket, obj.object_name)
+                    expired += 1
+        return expired
+
+    def expire_versions(self, prefix: str, keep: List[str]) -> int:
+        # Delete every {prefix}/<version>/ directory whose version is not in keep
+        bucket = self._config.get("bucket")
+        expired = 0
+        with connect_minio(self._config) as client:
+            for obj in client.list_objects(bucket, prefix=f"{prefix}/", recursive=True):
+                version, sep, _ = obj.object_name[len(prefix) + 1:].partition("/")
+                if sep and version not in keep:
+                    client.remove_object(bucket, obj.object_name)
+                    expired += 1
+        return expired
+
+    def _ensure_bucket(self, client):
+        # Make bucket if not exist.
+        bucket_name = self._config.get("bucket")
+        if not client.bucket_exists(bucket_name):
+            client.make_bucket(bucket_name)
+
+    def _download(self, key_name: str) -> Optional[List[str]]:
+        # Local copies of the table's live files, or None when nothing is stored yet
+        manifest = self.read_manifest(key_name)
+        object_names = [f["key"] for f in manifest["files"]] if manifest else [f"{key_name}.pq"]
+        local_paths = []
+        from minio.error import S3Error
+        with connect_minio(self._config) as client:
+            try:
+                for object_name in object_names:
+                    local_paths.append(tmp_file())
+                    client.fget_object(self._config.get("bucket"), object_name, local_paths[-1])
+            except S3Error as e:
+                remove_files(local_paths)
+                if e.code in ("NoSuchKey", "NoSuchBucket") and manifest is None:
+                    return None
+                raise
+        return local_paths
+
+    def _get_object(self, key_name: str) -> Optional[bytes]:
+        from minio.error import S3Error
+        with connect_minio(self._config) as client:
+            try:
+                response = client.get_object(self._config.get("bucket"), key_name)
+            except S3Error as e:
+                if e.code in ("NoSuchKey", "NoSuchBucket"):
+                    return None
+                raise
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
@@ -1,10 +1,14 @@
+from __future__ import annotations
 from contextlib import contextmanager
-import pandas as pd
+from typing import TYPE_CHECKING
 from dagster import IOManager, OutputContext, InputContext
-from sqlalchemy import create_engine
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 @contextmanager
 def connect_mysql(config):
+    from sqlalchemy import create_engine
     conn_info = (
         f"mysql+pymysql://{config['user']}:{config['password']}"
         + f"@{config['host']}:{config['port']}"
@@ -27,6 +31,7 @@ class MySQLIOManager(IOManager):
         pass
     
     def extract_data(self, sql: str) -> pd.DataFrame:
+        import pandas as pd
         with connect_mysql(self._config) as db_conn:
             pd_data = pd.read_sql_query(sql, db_conn)
         return pd_data
@@ -0,0 +1,262 @@
+# from contextlib import contextmanager
+# from datetime import datetime
+# import pandas as pd
+# from dagster import IOManager, OutputContext, InputContext
+# from sqlalchemy import create_engine
+
+# @contextmanager
+# def connect_psql(config):
+#     conn_info = (
+#         f"postgresql+psycopg2://{config['user']}:{config['password']}"
+#         + f"@{config['host']}:{config['port']}"
+#         + f"/{config['database']}"
+#     )
+
+#     db_conn = create_engine(conn_info)
+#     try:
+#         yield db_conn
+#     except Exception:
+#         raise
+
+# class PostgreSQLIOManager(IOManager):
+#     def __init__(self, config):
+#         self._config = config
+
+#     def load_input(self, context: "InputContext") -> pd.DataFrame:
+#         pass
+
+#     def handle_output(self, context: OutputContext, obj: pd.DataFrame):
+#         schema,table = context.asset_key.path[-2],context.asset_key.path[-1]
+#         tmp_tbl = f"{table}_tmp_{datetime.now().strftime('%Y_%m_%d')}"
+
+#         with connect_psql(self._config) as db_conn:
+#             primary_keys = (context.metadata or {}).get("primary_keys", [])
+#             ls_columns = (context.metadata or {}).get("columns", [])
+
+#             with db_conn.connect() as cursor:
+#                 cursor.execute(
+#                     f"CREATE TEMP TABLE IF NOT EXISTS {tmp_tbl} (LIKE {schema}.{table})"
+#                 )
+#                 obj[ls_columns].to_sql(
+#                     name = tmp_tbl,
+#                     con = db_conn,
+#                     schema = schema,
+#                     if_exists = "replace",
+#                     index = False,
+#                     chunksize= 10000,
+#                     method = "multi",
+#             )
+#         with db_conn.connect() as cursor:
+#             result = cursor.execute(f"SELECT COUNT(*) FROM {tmp_tbl}")
+#             for row in result:
+#                 print(f"Temp table records: {row}")
+
+#                 if len(primary_keys) > 0:
+#                     conditions = "AND".join(
+#                         [
+#                             f""" {schema}.{table}."{k}" = {tmp_tbl}."{k}" """
+#                             for k in primary_keys
+#                         ]
+#                     )
+#                     command = f"""
+#                          BEGIN TRANSACTION;
+#                          DELETE FROM {schema}.{table}
+#                          USING {tmp_tbl}
+#                          WHERE {conditions};
+
+#                          INSERT INTO {schema}.{table}
+#                          SELECT * FROM {tmp_tbl};
+#                          END TRANSACTION;
+#                     """
+#                 else:
+#                     command = f"""
+#                          BEGIN TRANSACTION;
+#                          TRUNCATE TABLE {schema}.{table};
+#                          INSERT INTO {schema}.{table}
+#                          SELECT * FROM {tmp_tbl};
+
+#                          END TRANSACTION;
+#                     """
+
+#                 cursor.execute(command)
+#                 cursor.execute(f"DROP TABLE IF EXISTS {tmp_tbl}")
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from typing import TYPE_CHECKING
+from dagster import IOManager, OutputContext, InputContext
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_engines = {}
+_engines_lock = Lock()
+
+def get_engine(config):
+    from sqlalchemy import create_engine
+    # One bounded connection pool per database and process, shared by every warehouse table
+    conn_info = (
+    f"postgresql+psycopg2://{config['user']}:{config['password']}" + f"@{config['host']}:{config['port']}" + f"/{config['database']}"
+    )
+    with _engines_lock:
+        if conn_info not in _engines:
+            _engines[conn_info] = create_engine(
+                conn_info,
+                pool_size=int(config.get("pool_size") or 4),
+                max_overflow=0,
+                pool_pre_ping=True
+            )
+        return _engines[conn_info]
+
+@contextmanager
+def connect_psql(config):
+    db_conn = get_engine(config)
+    try:
+        yield db_conn
+    except Exception:
+        raise
+
+def _is_list_column(dtype) -> bool:
+    import pandas as pd
+    import pyarrow as pa
+    return isinstance(dtype, pd.ArrowDtype) and pa.types.is_list(dtype.pyarrow_dtype)
+
+def prepare_array_columns(obj: pd.DataFrame):
+    import pandas as pd
+    import pyarrow as pa
+    from sqlalchemy.dialects.postgresql import ARRAY, TEXT
+    # Arrow list columns become Postgres TEXT[] columns; psycopg2 adapts Python lists to arrays
+    array_columns = [col for col, dtype in obj.dtypes.items() if _is_list_column(dtype)]
+    if not array_columns:
+        return obj, None
+    obj = obj.assign(**{
+        col: pd.Series(pa.array(obj[col].array).to_pylist(), index=obj.index, dtype=object)
+        for col in array_columns
+    })
+    return obj, {col: ARRAY(TEXT) for col in array_columns}
+
+def create_table_statements(schema: str, table: str, spec: dict) -> list:
+    columns = [f"{col} {spec['column_types'][col]}" for col in spec["columns"]]
+    if spec.get("primary_keys"):
+        columns.append(f"PRIMARY KEY ({', '.join(spec['primary_keys'])})")
+    partition = f" PARTITION BY RANGE ({spec['partition_by']})" if spec.get("partition_by") else ""
+    statements = [
+        f"CREATE SCHEMA IF NOT EXISTS {schema}",
+        f"CREATE TABLE IF NOT EXISTS {schema}.{table} ({', '.join(columns)}){partition}"
+    ]
+    # An existing table keeps its old DDL, so columns the spec now allows to be NULL are relaxed here
+    for col in spec["columns"]:
+        if "NOT NULL" not in spec["column_types"][col] and col not in spec.get("primary_keys", []):
+            statements.append(f"ALTER TABLE {schema}.{table} ALTER COLUMN {col} DROP NOT NULL")
+    if spec.get("partition_by"):
+        statements.append(f"CREATE TABLE IF NOT EXISTS {schema}.{table}_default PARTITION OF {schema}.{table} DEFAULT")
+    for index_columns in spec.get("indexes", []):
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {table}_{'_'.join(index_columns)}_idx ON {schema}.{table} ({', '.join(index_columns)})"
+        )
+    return statements
+
+def monthly_partition_statements(schema: str, table: str, spec: dict, obj: pd.DataFrame) -> list:
+    if not spec.get("partition_by"):
+        return []
+    import pandas as pd
+    months = pd.to_datetime(obj[spec["partition_by"]]).dt.to_period("M").dropna().unique()
+    return [
+        f"CREATE TABLE IF NOT EXISTS {schema}.{table}_p{month.strftime('%Y%m')} PARTITION OF {schema}.{table} "
+        f"FOR VALUES FROM ('{month.start_time.date()}') TO ('{(month + 1).start_time.date()}')"
+        for month in sorted(months)
+    ]
+
+def materialized_view_statements(schema: str, table: str, spec: dict) -> list:
+    statements = []
+    for view in spec.get("materialized_views", []):
+        statements += [
+            f"CREATE MATERIALIZED VIEW IF NOT EXISTS {schema}.{view['name']} AS "
+            + view["query"].format(schema=schema, table=table),
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {view['name']}_key_idx ON {schema}.{view['name']} ({', '.join(view['unique_key'])})",
+            # Concurrent refresh keeps the view readable while it is rebuilt
+            f"REFRESH MATERIALIZED VIEW CONCURRENTLY {schema}.{view['name']}"
+        ]
+    return statements
+
+def _write_frame(conn, schema: str, table: str, obj: pd.DataFrame, dtype):
+    obj.to_sql(
+        name=f"{table}",
+        con=conn,
+        schema=schema,
+        if_exists="append",
+        index=False,
+        chunksize=10000,
+        method="multi",
+        dtype=dtype
+    )
+
+class PostgreSQLIOManager(IOManager):
+    def __init__(self, config):
+        self._config = config
+    def load_input(self, context: InputContext) -> pd.DataFrame:
+        pass
+    def handle_output(self, context: OutputContext, obj: pd.DataFrame):
+        from sqlalchemy import text
+        schema, table = context.asset_key.path[-2], context.asset_key.path[-1]
+        spec = context.metadata or {}
+        data, dtype = prepare_array_columns(obj[spec.get("columns", [])])
+        with connect_psql(self._config) as engine:
+            # The table keeps its DDL; its contents are swapped in one transaction
+            with engine.begin() as conn:
+                for statement in create_table_statements(schema, table, spec):
+                    conn.execute(text(statement))
+                conn.execute(text(f"TRUNCATE TABLE {schema}.{table}"))
+                for statement in monthly_partition_statements(schema, table, spec, data):
+                    conn.execute(text(statement))
+                _write_frame(conn, schema, table, data, dtype)
+            with engine.begin() as conn:
+                for statement in materialized_view_statements(schema, table, spec):
+                    conn.execute(text(statement))
+
+    def load_tables(self, tables: list) -> dict:
+        # Stream every (schema, table, spec, obj) into a staging table concurrently over the pool,
+        # then swap all targets in one transaction: readers see the old warehouse or the new one
+        from sqlalchemy import text
+        prepared = []
+        for schema, table, spec, obj in tables:
+            data, dtype = prepare_array_columns(obj[spec.get("columns", [])])
+            prepared.append((schema, table, spec, data, dtype))
+
+        with connect_psql(self._config) as engine:
+            with engine.begin() as conn:
+                for schema, table, spec, _, _ in prepared:
+                    for statement in create_table_statements(schema, table, spec):
+                        conn.execute(text(statement))
+
+            def stage(entry):
+                schema, table, _, data, dtype = entry
+                with engine.begin() as conn:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table}__staging"))
+                    conn.execute(text(
+                        f"CREATE UNLOGGED TABLE {schema}.{table}__staging (LIKE {schema}.{table} INCLUDING DEFAULTS)"
+                    ))
+                    _write_frame(conn, schema, f"{table}__staging", data, dtype)
+                return table, len(data)
+
+            with ThreadPoolExecutor(max_workers=engine.pool.size()) as executor:
+                row_counts = dict(executor.map(stage, prepared))
+
+            with engine.begin() as conn:
+                for schema, table, spec, data, _ in prepared:
+                    conn.execute(text(f"TRUNCATE TABLE {schema}.{table}"))
+                    for statement in monthly_partition_statements(schema, table, spec, data):
+                        conn.execute(text(statement))
+                    columns = ", ".join(spec["columns"])
+                    conn.execute(text(
+                        f"INSERT INTO {schema}.{table} ({columns}) SELECT {columns} FROM {schema}.{table}__staging"
+                    ))
+                    conn.execute(text(f"DROP TABLE {schema}.{table}__staging"))
+
+            with engine.begin() as conn:
+                for schema, table, spec, _, _ in prepared:
+                    for statement in materialized_view_statements(schema, table, spec):
+                        conn.execute(text(statement))
+        return row_counts
@@ -0,0 +1,234 @@
+"""customer_id-indexed lookup store over the churn and review summaries.
+
+The store is a directory with two memory-mapped NumPy files aligned row by row:
+``keys.npy`` holds the sorted, fixed-width customer ids and ``values.npy`` a
+structured record per customer. A lookup is one vectorised binary search over the
+mapped keys, so batches of thousands of ids cost about as much as a single one.
+``customers.parquet`` carries the same rows sorted by customer_id with page indexes
+for tools that prefer Parquet.
+
+Run the HTTP API with ``python -m etl_pipeline.serving.customer_lookup``.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STORE_PREFIX = "serving/ecom/customer_lookup"
+LATEST_KEY = f"{STORE_PREFIX}/_latest.json"
+STORE_FILES = ["keys.npy", "values.npy", "customers.parquet"]
+
+VALUE_DTYPE = np.dtype([
+    ("churn", "i1"),
+    ("days_since_last_purchase", "i4"),
+    ("total_orders", "i4"),
+    ("total_reviews", "i4"),
+    ("total_spent", "f8"),
+    ("average_review_score", "f8"),
+    ("last_purchase_timestamp", "datetime64[ns]")
+])
+MISSING_DAYS = -1
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_ids(customer_ids) -> np.ndarray:
+    return np.char.encode(np.asarray(customer_ids, dtype=str), "utf-8")
+
+
+def build_store(churn: pd.DataFrame, review_summary: pd.DataFrame, store_dir: str) -> dict:
+    customers = churn.merge(
+        review_summary[["customer_id", "total_reviews"]],
+        on="customer_id",
+        how="left"
+    )
+    encoded = _encode_ids(customers["customer_id"])
+    width = max(1, int(np.char.str_len(encoded).max(initial=1)))
+    keys = encoded.astype(f"S{width}")
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    order, keys = order[first], keys[first]
+    customers = customers.iloc[order].reset_index(drop=True)
+
+    values = np.zeros(len(customers), dtype=VALUE_DTYPE)
+    values["churn"] = customers["churn"].to_numpy()
+    values["days_since_last_purchase"] = customers["days_since_last_purchase"].fillna(MISSING_DAYS).to_numpy()
+    values["total_orders"] = customers["total_orders"].to_numpy()
+    values["total_reviews"] = customers["total_reviews"].fillna(0).to_numpy()
+    values["total_spent"] = customers["total_spent"].to_numpy()
+    values["average_review_score"] = customers["average_review_score"].to_numpy()
+    values["last_purchase_timestamp"] = pd.to_datetime(customers["last_purchase_timestamp"]).to_numpy(dtype="datetime64[ns]")
+
+    np.save(os.path.join(store_dir, "keys.npy"), keys)
+    np.save(os.path.join(store_dir, "values.npy"), values)
+    pq.write_table(
+        pa.Table.from_pandas(customers, preserve_index=False),
+        os.path.join(store_dir, "customers.parquet"),
+        row_group_size=64 * 1024,
+        write_page_index=True
+    )
+    return {"rows": len(keys), "key_width": width}
+
+
+class CustomerLookup:
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.keys = np.load(os.path.join(store_dir, "keys.npy"), mmap_mode="r")
+        self.values = np.load(os.path.join(store_dir, "values.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, customer_ids: Iterable[str]):
+        # Returns (found mask, records for the found ids in request order)
+        query = _encode_ids(list(customer_ids))
+        if len(self.keys) == 0 or len(query) == 0:
+            return np.zeros(len(query), dtype=bool), self.values[:0]
+        fits = np.char.str_len(query) <= self.keys.dtype.itemsize
+        query = query.astype(self.keys.dtype)
+        positions = np.minimum(np.searchsorted(self.keys, query), len(self.keys) - 1)
+        found = fits & (self.keys[positions] == query)
+        return found, self.values[positions[found]]
+
+    def lookup_records(self, customer_ids: List[str]) -> List[Optional[dict]]:
+        found, values = self.lookup(customer_ids)
+        records = [None] * len(customer_ids)
+        for i, value in zip(np.flatnonzero(found).tolist(), values):
+            days = int(value["days_since_last_purchase"])
+            records[i] = {
+                "customer_id": customer_ids[i],
+                "churn": int(value["churn"]),
+                "days_since_last_purchase": None if days == MISSING_DAYS else days,
+                "total_orders": int(value["total_orders"]),
+                "total_reviews": int(value["total_reviews"]),
+                "total_spent": None if np.isnan(value["total_spent"]) else float(value["total_spent"]),
+                "average_review_score": None if np.isnan(value["average_review_score"]) else float(value["average_review_score"]),
+                "last_purchase_timestamp": None if np.isnat(value["last_purchase_timestamp"]) else str(value["last_purchase_timestamp"])
+            }
+        return records
+
+
+def sync_store(minio_config: dict, local_dir: str, current_version: Optional[str] = None) -> Optional[str]:
+    # Downloads the latest published store when it is newer than current_version; returns its directory
+    from ..resources.minio_io_manager import connect_minio
+    bucket = minio_config.get("bucket")
+    with connect_minio(minio_config) as client:
+        response = client.get_object(bucket, LATEST_KEY)
+        try:
+            latest = json.loads(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+        if latest["version"] == current_version:
+            return None
+        store_dir = os.path.join(local_dir, latest["version"])
+        os.makedirs(store_dir, exist_ok=True)
+        for name in STORE_FILES:
+            client.fget_object(bucket, f"{STORE_PREFIX}/{latest['version']}/{name}", os.path.join(store_dir, name))
+    return store_dir
+
+
+class LookupService:
+    def __init__(self, minio_config: dict, local_dir: str, refresh_seconds: int):
+        self.minio_config = minio_config
+        self.local_dir = local_dir
+        self.refresh_seconds = refresh_seconds
+        self.version = None
+        self.lookup = None
+
+    def refresh(self):
+        store_dir = sync_store(self.minio_config, self.local_dir, self.version)
+        if store_dir is not None:
+            # swap the reference atomically, in-flight requests keep the previous store
+            self.lookup = CustomerLookup(store_dir)
+            self.version = os.path.basename(store_dir)
+            # mapped files of older stores stay valid for readers after unlinking
+            for name in os.listdir(self.local_dir):
+                if name != self.version:
+                    shutil.rmtree(os.path.join(self.local_dir, name), ignore_errors=True)
+
+    def refresh_forever(self):
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.exception(f"Customer lookup refresh failed: {e}")
+
+
+def make_handler(service: LookupService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if service.lookup is None:
+                return self._send(503, {"error": "lookup store not published yet"})
+            if self.path == "/healthz":
+                return self._send(200, {"version": service.version, "customers": len(service.lookup)})
+            if self.path.startswith("/customers/"):
+                customer_id = self.path[len("/customers/"):]
+                record = service.lookup.lookup_records([customer_id])[0]
+                return self._send(200 if record else 404, record or {"customer_id": customer_id})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/customers/lookup":
+                return self._send(404, {"error": "not found"})
+            if service.lookup is None:
+                return self._send(503, {"error": "lookup store not published yet"})
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            customer_ids = [str(customer_id) for customer_id in payload.get("customer_ids", [])]
+            self._send(200, {"version": service.version, "customers": service.lookup.lookup_records(customer_ids)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve customer churn and spend lookups")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--store-dir", default="/tmp/customer_lookup")
+    parser.add_argument("--refresh-seconds", type=int, default=60)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    # the same variables as MINIO_CONFIG in the package __init__
+    minio_config = {
+        "endpoint_url": os.getenv("MINIO_ENDPOINT"),
+        "bucket": os.getenv("DATALAKE_BUCKET"),
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY")
+    }
+    service = LookupService(minio_config, args.store_dir, args.refresh_seconds)
+    try:
+        service.refresh()
+    except Exception as e:
+        logger.warning(f"No customer lookup store available yet: {e}")
+    threading.Thread(target=service.refresh_forever, daemon=True).start()
+    logger.info(f"Serving customer lookups (store {service.version}) on {args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), make_handler(service)).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
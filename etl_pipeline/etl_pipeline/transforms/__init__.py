@@ -0,0 +1,2 @@
+# Transform kernels used by the asset bodies. They depend on pandas, pyarrow and polars,
+# so they are imported from inside the assets rather than re-exported here.
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .groupby import GroupBy
+
+
+def build_order_baskets(orders: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    items = orders[["order_id", "product_id"]].merge(
+        products[["product_id", "product_category_name_english"]],
+        on="product_id"
+    )
+    items = items[items["order_id"].notna() & items["product_category_name_english"].notna()]
+
+    # Grouped by sorted order id, the group sizes become the list offsets
+    orders_grouped = GroupBy(items["order_id"], sort=True)
+    offsets, categories = orders_grouped.collect(items["product_category_name_english"].to_numpy(dtype=object))
+    baskets = pa.ListArray.from_arrays(
+        pa.array(offsets),
+        pc.utf8_trim_whitespace(pa.array(categories, type=pa.string()))
+    )
+
+    return pd.DataFrame({
+        "order_id": np.asarray(orders_grouped.keys, dtype=object),
+        "list_of_products": pd.arrays.ArrowExtensionArray(baskets)
+    })
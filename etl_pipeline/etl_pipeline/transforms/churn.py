@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+# numpy and pandas are imported in the function, so the asset config can read the default
+if TYPE_CHECKING:
+    import pandas as pd
+
+NS_PER_DAY = 24 * 60 * 60 * 1_000_000_000
+# Days without a purchase after which a customer counts as churned
+DEFAULT_CHURN_HORIZON_DAYS = 180
+
+
+def compute_customer_churn(review_summary: pd.DataFrame, last_purchase: pd.DataFrame, horizon_days: int = DEFAULT_CHURN_HORIZON_DAYS) -> pd.DataFrame:
+    import numpy as np
+    import pandas as pd
+
+    # Index the last purchases once by customer and join the summary against it
+    last_purchase_ts = pd.to_datetime(last_purchase["last_purchase_timestamp"])
+    last_purchase_idx = pd.DataFrame(
+        {"last_purchase_timestamp": last_purchase_ts.to_numpy()},
+        index=pd.Index(last_purchase["customer_id"], name="customer_id")
+    )
+    churn_df = review_summary[["customer_id", "total_orders", "total_spent", "average_review_score"]].join(
+        last_purchase_idx,
+        on="customer_id",
+        how="inner"
+    ).reset_index(drop=True)
+
+    # Integer nanosecond arithmetic on the datetime64 values, no per-row date parsing
+    purchase_ns = churn_df["last_purchase_timestamp"].to_numpy(dtype="datetime64[ns]").view("int64")
+    missing = churn_df["last_purchase_timestamp"].isna().to_numpy()
+    elapsed_ns = last_purchase_ts.max().value - purchase_ns
+
+    days_since_last_purchase = elapsed_ns // NS_PER_DAY
+    if missing.any():
+        churn_df["days_since_last_purchase"] = pd.array(np.where(missing, 0, days_since_last_purchase), dtype="Int64")
+        churn_df.loc[missing, "days_since_last_purchase"] = pd.NA
+    else:
+        churn_df["days_since_last_purchase"] = days_since_last_purchase
+    churn_df["churn"] = ((elapsed_ns > horizon_days * NS_PER_DAY) & ~missing).astype("int64")
+
+    return churn_df
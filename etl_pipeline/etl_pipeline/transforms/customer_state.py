@@ -0,0 +1,285 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .dedup import key_fingerprint
+from .groupby import GroupBy
+from .silver_joins import ORDERS_COLUMNS
+
+# Per-customer aggregates kept in the lake between runs, so each run only folds in the rows
+# it has not seen before. Each section is owned by one asset and committed by a JSON record
+# naming the table versions that belong together. Tables listed under "append" only grow,
+# so an incremental run adds its new rows as one more file instead of rewriting them.
+STATE_PREFIX = "state/ecom/customer_state"
+REVIEW_SUMMARY_STATE = {
+    "commit": f"{STATE_PREFIX}/review_summary.json",
+    "tables": {
+        "orders": f"{STATE_PREFIX}/review_orders",
+        "customers": f"{STATE_PREFIX}/review_customers",
+        "order_rows": f"{STATE_PREFIX}/seen_order_rows",
+        "reviews": f"{STATE_PREFIX}/seen_reviews"
+    },
+    "append": ["order_rows", "reviews"]
+}
+LAST_PURCHASE_STATE = {
+    "commit": f"{STATE_PREFIX}/last_purchase.json",
+    "tables": {
+        "customers": f"{STATE_PREFIX}/last_purchase_customers",
+        "purchases": f"{STATE_PREFIX}/seen_purchases"
+    },
+    "append": ["purchases"]
+}
+
+# Rows are fingerprinted over every column the aggregates read, so a changed score or
+# timestamp shows up as a seen row gone and triggers a rebuild. Only rows whose purchase falls
+# within a lookback window of the latest purchase seen are fingerprinted at all; older rows are
+# taken as settled, and changes to them are picked up by the periodic full rebuild.
+PURCHASE_COLUMNS = ["order_id", "customer_id", "last_purchase_timestamp"]
+REVIEW_COLUMNS = ["review_id", "order_id", "score"]
+# per order: silver order rows (and their payments) x reviews, as seen by the SQL join
+ORDER_FACTS = ["rows_o", "pay_sum", "pay_count", "rows_r", "review_count", "score_sum", "score_count"]
+# per customer: what each order adds to the review summary
+CONTRIBUTIONS = ["orders", "reviews", "score_sum", "score_count", "spent", "spent_count"]
+
+
+def load_state(minio_io_manager, spec: dict) -> Optional[dict]:
+    # None when the state is missing or its tables are not the versions last committed together
+    from ..resources.minio_io_manager import content_version
+    commit = minio_io_manager.read_json(spec["commit"])
+    if commit is None:
+        return None
+    state = {}
+    for name, key in spec["tables"].items():
+        manifest = minio_io_manager.read_manifest(key)
+        if manifest is None or content_version(manifest) != commit["versions"].get(name):
+            return None
+        state[name] = minio_io_manager.read_frame(key)
+    return state
+
+
+def save_state(minio_io_manager, spec: dict, state: dict, previous: Optional[dict] = None, **extra):
+    # previous is the loaded state this one was folded from; its append tables come first in
+    # the new ones, so only the rows past them are written. extra fields go into the commit record.
+    committed = minio_io_manager.read_json(spec["commit"])["versions"] if previous is not None else {}
+    versions = {}
+    for name, key in spec["tables"].items():
+        if previous is None or name not in spec.get("append", []):
+            versions[name] = minio_io_manager.write_frame(key, state[name])["content_version"]
+            continue
+        added = state[name].iloc[len(previous[name]):]
+        if len(added) == 0:
+            versions[name] = committed[name]
+        else:
+            versions[name] = minio_io_manager.append_frame(key, added, committed[name])["content_version"]
+    minio_io_manager.write_json(spec["commit"], {"versions": versions, **extra})
+
+
+def row_fingerprints(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    # Identical rows are legitimate in the order join, so the occurrence number is hashed in too
+    fingerprints = key_fingerprint(df, columns)
+    occurrence = pd.Series(fingerprints).groupby(fingerprints).cumcount().to_numpy()
+    return key_fingerprint(pd.DataFrame({"row": fingerprints, "occurrence": occurrence}), ["row", "occurrence"])
+
+
+def unseen(fingerprints: np.ndarray, seen: pd.DataFrame) -> Optional[np.ndarray]:
+    # Mask of new rows, or None when rows seen before are gone and the state must be rebuilt
+    known = np.isin(fingerprints, seen["fingerprint"].to_numpy())
+    if known.sum() != len(seen):
+        return None
+    return ~known
+
+
+def in_window(at: np.ndarray, since) -> np.ndarray:
+    # Rows without a purchase time never settle, so they are always in the window
+    at = np.asarray(at, dtype="datetime64[ns]")
+    if pd.isna(since):
+        return np.ones(len(at), dtype=bool)
+    return np.isnat(at) | (at >= np.datetime64(since, "ns"))
+
+
+def window_start(seen: pd.DataFrame, lookback: pd.Timedelta):
+    # NaT, meaning every row, until a purchase time has been seen
+    return seen["at"].max() - lookback
+
+
+def _seen_frame(fingerprints: np.ndarray, at: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({
+        "fingerprint": np.asarray(fingerprints).astype("uint64"),
+        "at": np.asarray(at, dtype="datetime64[ns]")
+    })
+
+
+def _add_seen(seen: pd.DataFrame, fingerprints: np.ndarray, at: np.ndarray, lookback: pd.Timedelta) -> pd.DataFrame:
+    # The previous rows stay first, as save_state appends only the rows past them. A build from
+    # an empty state drops what is already settled, so later runs never read it back.
+    added = _seen_frame(fingerprints, at)
+    if len(seen) == 0:
+        return added[in_window(added["at"].to_numpy(), window_start(added, lookback))].reset_index(drop=True)
+    return pd.concat([seen, added], ignore_index=True)
+
+
+def _purchase_times(timestamps: pd.Series) -> np.ndarray:
+    return pd.to_datetime(timestamps, errors="coerce").to_numpy(dtype="datetime64[ns]")
+
+
+def order_facts(orders: pd.DataFrame, reviews: pd.DataFrame) -> pd.DataFrame:
+    # Both sides share one factorisation of order_id, so their aggregates line up by code.
+    # Rows without an order_id get code -1 and are left out, as the SQL join drops them.
+    codes, order_ids = pd.factorize(np.concatenate([
+        orders["order_id"].to_numpy(dtype=object),
+        reviews["order_id"].to_numpy(dtype=object)
+    ]))
+    order_codes, review_codes = codes[:len(orders)], codes[len(orders):]
+    orders, reviews = orders[order_codes >= 0], reviews[review_codes >= 0]
+    order_codes, review_codes = order_codes[order_codes >= 0], review_codes[review_codes >= 0]
+    facts = pd.DataFrame(0.0, index=pd.Index(order_ids, name="order_id"), columns=ORDER_FACTS)
+    customer_id = np.full(len(order_ids), None, dtype=object)
+
+    by_order = GroupBy(order_codes, sort=False)
+    rows = np.asarray(by_order.keys)
+    payment = orders["payment_value"].to_numpy(dtype="float64")
+    customer_id[rows] = by_order.first(orders["customer_id"].to_numpy(dtype=object))
+    facts.iloc[rows, facts.columns.get_indexer(["rows_o", "pay_sum", "pay_count"])] = np.column_stack([
+        by_order.size(), by_order.sum(payment), by_order.count(payment)
+    ])
+
+    by_review_order = GroupBy(review_codes, sort=False)
+    rows = np.asarray(by_review_order.keys)
+    score = reviews["score"].to_numpy(dtype="float64")
+    facts.iloc[rows, facts.columns.get_indexer(["rows_r", "review_count", "score_sum", "score_count"])] = np.column_stack([
+        by_review_order.size(),
+        by_review_order.count(reviews["review_id"].to_numpy(dtype=object)),
+        by_review_order.sum(score),
+        by_review_order.count(score)
+    ])
+
+    facts.insert(0, "customer_id", customer_id)
+    return facts
+
+
+def contributions(facts: pd.DataFrame) -> pd.DataFrame:
+    # Each joined row of an order counts once per matching review and once per order row
+    return pd.DataFrame({
+        "orders": ((facts["rows_o"] > 0) & (facts["rows_r"] > 0)).astype("int64"),
+        "reviews": facts["rows_o"] * facts["review_count"],
+        "score_sum": facts["rows_o"] * facts["score_sum"],
+        "score_count": facts["rows_o"] * facts["score_count"],
+        "spent": facts["pay_sum"] * facts["rows_r"],
+        "spent_count": facts["pay_count"] * facts["rows_r"]
+    }, index=facts.index)
+
+
+def empty_review_state() -> dict:
+    return {
+        "orders": pd.DataFrame(columns=["order_id", "customer_id"] + ORDER_FACTS).astype({c: "float64" for c in ORDER_FACTS}),
+        "customers": pd.DataFrame(columns=["customer_id"] + CONTRIBUTIONS).astype({c: "float64" for c in CONTRIBUTIONS}),
+        "order_rows": _seen_frame(np.empty(0), np.empty(0)),
+        "reviews": _seen_frame(np.empty(0), np.empty(0))
+    }
+
+
+def update_review_state(state: dict, orders: pd.DataFrame, reviews: pd.DataFrame, lookback: pd.Timedelta) -> Tuple[Optional[dict], int]:
+    # Fold only the unseen order rows and reviews into the state; (None, 0) asks for a rebuild.
+    # A review falls in the window by the purchase time of its order.
+    if any("at" not in state[name] for name in ("order_rows", "reviews")):
+        return None, 0
+    since = window_start(state["order_rows"], lookback)
+    order_at = _purchase_times(orders["order_purchase_timestamp"])
+    purchased = pd.Series(order_at, index=orders["order_id"].to_numpy(dtype=object))
+    review_at = purchased[~purchased.index.duplicated()].reindex(reviews["order_id"].to_numpy(dtype=object)).to_numpy(dtype="datetime64[ns]")
+    order_window, review_window = in_window(order_at, since), in_window(review_at, since)
+    orders, order_at = orders[order_window], order_at[order_window]
+    reviews, review_at = reviews[review_window], review_at[review_window]
+
+    order_fingerprints = row_fingerprints(orders, ORDERS_COLUMNS)
+    review_fingerprints = row_fingerprints(reviews, REVIEW_COLUMNS)
+    seen_orders, seen_reviews = state["order_rows"], state["reviews"]
+    new_orders = unseen(order_fingerprints, seen_orders[in_window(seen_orders["at"].to_numpy(), since)])
+    new_reviews = unseen(review_fingerprints, seen_reviews[in_window(seen_reviews["at"].to_numpy(), since)])
+    if new_orders is None or new_reviews is None:
+        return None, 0
+
+    delta = order_facts(orders[new_orders], reviews[new_reviews])
+    order_state = state["orders"].set_index("order_id")
+    before = order_state.reindex(delta.index)
+    after = before[ORDER_FACTS].fillna(0) + delta[ORDER_FACTS]
+    after.insert(0, "customer_id", before["customer_id"].fillna(delta["customer_id"]))
+
+    # Orders without a known customer contribute nothing yet, their reviews are kept for later
+    change = contributions(after) - contributions(before[ORDER_FACTS].fillna(0))
+    by_customer = GroupBy(after["customer_id"].to_numpy(dtype=object))
+    change = pd.DataFrame(
+        {column: by_customer.sum(change[column].to_numpy(dtype="float64")) for column in CONTRIBUTIONS},
+        index=pd.Index(by_customer.keys, name="customer_id")
+    )
+    customers = state["customers"].set_index("customer_id").add(change, fill_value=0)
+    order_state = pd.concat([order_state.drop(index=delta.index, errors="ignore"), after])
+    return {
+        "orders": order_state.rename_axis("order_id").reset_index(),
+        "customers": customers.rename_axis("customer_id").reset_index(),
+        "order_rows": _add_seen(seen_orders, order_fingerprints[new_orders], order_at[new_orders], lookback),
+        "reviews": _add_seen(seen_reviews, review_fingerprints[new_reviews], review_at[new_reviews], lookback)
+    }, len(delta)
+
+
+def review_summary_from_state(state: dict) -> pd.DataFrame:
+    customers = state["customers"].set_index("customer_id")
+    customers = customers[customers["orders"] > 0].sort_index()
+    score_count = customers["score_count"].to_numpy()
+    return pd.DataFrame({
+        "customer_id": customers.index.astype(str).str.strip('"'),
+        "total_orders": customers["orders"].to_numpy(dtype="int64"),
+        "total_reviews": customers["reviews"].to_numpy(dtype="int64"),
+        # AVG over no scores is NULL in SQL, which the summary reports as 0
+        "average_review_score": np.divide(
+            customers["score_sum"].to_numpy(dtype="float64"),
+            score_count,
+            out=np.zeros(len(customers)),
+            where=score_count > 0
+        ),
+        "total_spent": customers["spent"].where(customers["spent_count"] > 0).to_numpy(dtype="float64")
+    })
+
+
+def empty_purchase_state() -> dict:
+    return {
+        "customers": pd.DataFrame({
+            "customer_id": pd.Series([], dtype=object),
+            "last_purchase_timestamp": pd.Series([], dtype="datetime64[ns]")
+        }),
+        "purchases": _seen_frame(np.empty(0), np.empty(0))
+    }
+
+
+def update_purchase_state(state: dict, purchases: pd.DataFrame, lookback: pd.Timedelta) -> Tuple[Optional[dict], int]:
+    if "at" not in state["purchases"]:
+        return None, 0
+    seen = state["purchases"]
+    since = window_start(seen, lookback)
+    at = purchases["last_purchase_timestamp"].to_numpy(dtype="datetime64[ns]")
+    window = in_window(at, since)
+    purchases, at = purchases[window], at[window]
+    fingerprints = row_fingerprints(purchases, PURCHASE_COLUMNS)
+    new_rows = unseen(fingerprints, seen[in_window(seen["at"].to_numpy(), since)])
+    if new_rows is None:
+        return None, 0
+
+    # Group the new rows only and upsert their customers; max() skips missing timestamps,
+    # customers with none at all keep a missing value
+    by_customer = GroupBy(purchases["customer_id"].to_numpy(dtype=object)[new_rows])
+    latest = by_customer.max(at[new_rows])
+    customers = state["customers"]
+    positions = pd.Index(customers["customer_id"]).get_indexer(np.asarray(by_customer.keys, dtype=object))
+    known = positions >= 0
+    timestamps = customers["last_purchase_timestamp"].to_numpy(dtype="datetime64[ns]").copy()
+    current, candidate = timestamps[positions[known]], latest[known]
+    timestamps[positions[known]] = np.where(np.isnat(current) | (candidate > current), candidate, current)
+    customers = pd.DataFrame({
+        "customer_id": np.concatenate([customers["customer_id"].to_numpy(dtype=object), np.asarray(by_customer.keys, dtype=object)[~known]]),
+        "last_purchase_timestamp": np.concatenate([timestamps, latest[~known]])
+    })
+    return {
+        "customers": customers,
+        "purchases": _add_seen(seen, fingerprints[new_rows], at[new_rows], lookback)
+    }, int(new_rows.sum())
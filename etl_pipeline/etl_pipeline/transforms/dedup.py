@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+
+# numpy and pandas are imported in the functions, so the asset config can read TIE_BREAKS
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# tie-break rule -> (column, keep the highest value)
+ORDERED_TIE_BREAKS = {
+    "highest_score": ("score", True),
+    "lowest_score": ("score", False)
+}
+TIE_BREAKS = ["first", "last"] + list(ORDERED_TIE_BREAKS)
+
+
+def key_fingerprint(df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    # Fixed-width uint64 per row hashed from the key columns only, whatever else the row carries
+    import pandas as pd
+
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+
+def duplicate_mask(df: pd.DataFrame, keys: List[str], tie_break: str = "first") -> np.ndarray:
+    # True for the rows to keep: one per key, chosen by the tie-break rule
+    import numpy as np
+    import pandas as pd
+
+    fingerprints = key_fingerprint(df, keys)
+    if tie_break in ("first", "last"):
+        return ~pd.Series(fingerprints).duplicated(keep=tie_break).to_numpy()
+
+    column, highest = ORDERED_TIE_BREAKS[tie_break]
+    values = df[column].to_numpy(dtype="float64")
+    # stable sort so equal values fall back to input order; missing values always lose
+    order = np.argsort(-values if highest else values, kind="stable")
+    winners = order[~pd.Series(fingerprints[order]).duplicated(keep="first").to_numpy()]
+    keep = np.zeros(len(df), dtype=bool)
+    keep[winners] = True
+    return keep
+
+
+def deduplicate(df: pd.DataFrame, keys: List[str], tie_break: str = "first") -> pd.DataFrame:
+    keep = duplicate_mask(df, keys, tie_break)
+    if keep.all():
+        return df
+    return df[keep]
+
+
+def deduplicate_batches(batches: Iterable[pd.DataFrame], keys: List[str], tie_break: str = "first") -> Iterator[pd.DataFrame]:
+    # Streaming variant: only the fingerprints of the keys kept so far are held, never the rows.
+    # A later batch cannot take back a row already yielded, so only the "first" rule streams.
+    if tie_break != "first":
+        raise ValueError(f"Streaming deduplication keeps the first row per key, tie_break={tie_break!r} needs every row in memory")
+    return _first_per_key(batches, keys)
+
+
+def _first_per_key(batches: Iterable[pd.DataFrame], keys: List[str]) -> Iterator[pd.DataFrame]:
+    import numpy as np
+
+    seen = set()
+    for batch in batches:
+        fingerprints = key_fingerprint(batch, keys)
+        keep = duplicate_mask(batch, keys, "first")
+        if seen:
+            keep &= np.fromiter((fingerprint not in seen for fingerprint in fingerprints.tolist()), dtype=bool, count=len(batch))
+        seen.update(fingerprints[keep].tolist())
+        yield batch if keep.all() else batch[keep]
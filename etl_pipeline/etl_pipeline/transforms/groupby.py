@@ -0,0 +1,64 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class GroupBy:
+    # Factorise the key once and sort the rows once; every aggregate is then a single
+    # reduceat over the contiguous groups. Rows with a missing key are dropped, as in a SQL join.
+
+    def __init__(self, keys, sort: bool = True):
+        codes, uniques = pd.factorize(keys, sort=sort)
+        valid = np.flatnonzero(codes >= 0)
+        self._rows = valid[np.argsort(codes[valid], kind="stable")]
+        sorted_codes = codes[self._rows]
+        boundaries = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+        self.starts = np.concatenate([[0], boundaries]) if len(sorted_codes) else np.empty(0, dtype=np.intp)
+        self.counts = np.diff(np.append(self.starts, len(sorted_codes)))
+        self.keys = uniques
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _sorted(self, values) -> np.ndarray:
+        return np.asarray(values)[self._rows]
+
+    def _reduce(self, ufunc, values: np.ndarray) -> np.ndarray:
+        if len(values) == 0:
+            return values[:0]
+        return ufunc.reduceat(values, self.starts)
+
+    def size(self) -> np.ndarray:
+        return self.counts
+
+    def count(self, values) -> np.ndarray:
+        # non-missing values per group
+        return self._reduce(np.add, (~pd.isna(self._sorted(values))).astype("int64"))
+
+    def sum(self, values) -> np.ndarray:
+        values = self._sorted(values)
+        if values.dtype.kind == "f":
+            values = np.where(np.isnan(values), 0.0, values)
+        return self._reduce(np.add, values)
+
+    def max(self, values) -> np.ndarray:
+        values = self._sorted(values)
+        if values.dtype.kind == "M":
+            # NaT is the smallest int64, so it only wins in groups without a timestamp
+            return self._reduce(np.maximum, values.view("int64")).view(values.dtype)
+        if values.dtype.kind == "f":
+            missing = np.isnan(values)
+            result = self._reduce(np.maximum, np.where(missing, -np.inf, values))
+            present = self._reduce(np.add, (~missing).astype("int64"))
+            return np.where(present > 0, result, np.nan)
+        return self._reduce(np.maximum, values)
+
+    def first(self, values) -> np.ndarray:
+        return self._sorted(values)[self.starts]
+
+    def collect(self, values) -> Tuple[np.ndarray, np.ndarray]:
+        # (list offsets, values in group order), ready for pa.ListArray.from_arrays
+        offsets = np.zeros(len(self) + 1, dtype="int32")
+        np.cumsum(self.counts, out=offsets[1:])
+        return offsets, self._sorted(values)
@@ -0,0 +1,109 @@
+import hashlib
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from .dedup import key_fingerprint
+from .groupby import GroupBy
+
+SUMMARY_SORT = ["sales_month", "product_category"]
+# Columns of the inputs the summary reads
+SALES_COLUMNS = ["order_purchase_timestamp", "product_id", "total_sales_value", "price"]
+PRODUCT_COLUMNS = ["product_id", "product_category_name_english"]
+
+# The summary and a digest per month of the rows it was built from, committed together as in customer_state
+MONTHLY_SALES_STATE = {
+    "commit": "state/ecom/monthly_sales/commit.json",
+    "tables": {
+        "summary": "state/ecom/monthly_sales/summary",
+        "months": "state/ecom/monthly_sales/month_digests"
+    }
+}
+
+
+def month_ordinal(timestamps: pd.Series) -> np.ndarray:
+    # year * 12 + month as a plain integer bucket id, -1 for unparsable timestamps
+    ts = pd.to_datetime(timestamps, errors="coerce")
+    ordinal = (ts.dt.year * 12 + ts.dt.month - 1).to_numpy(dtype="float64")
+    return np.where(np.isnan(ordinal), -1, ordinal).astype("int64")
+
+
+def ordinal_to_month(ordinal: int) -> str:
+    return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+
+
+def summarise_monthly_sales(products_sales: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    sales = products_sales[SALES_COLUMNS].merge(
+        products[PRODUCT_COLUMNS],
+        on="product_id"
+    )
+    sales["sales_month"] = pd.to_datetime(sales["order_purchase_timestamp"], errors="coerce").dt.strftime("%Y-%m")
+    summary = (
+        sales.groupby(["sales_month", "product_category_name_english"], dropna=False, sort=False)
+        .agg(total_sales_value=("total_sales_value", "sum"), total_products_sold=("price", "sum"))
+        .reset_index()
+        .rename(columns={"product_category_name_english": "product_category"})
+    )
+    summary["product_category"] = summary["product_category"].str.strip()
+    return sort_summary(summary)
+
+
+def sort_summary(summary: pd.DataFrame) -> pd.DataFrame:
+    return summary.sort_values(SUMMARY_SORT, na_position="first", kind="stable").reset_index(drop=True)
+
+
+def month_digests(products_sales: pd.DataFrame) -> pd.DataFrame:
+    # Row count and order-independent digest (the wrapping sum of the row fingerprints) per
+    # month bucket; the state keeps one row per month instead of one per sales row
+    by_month = GroupBy(month_ordinal(products_sales["order_purchase_timestamp"]))
+    return pd.DataFrame({
+        "month": np.asarray(by_month.keys, dtype="int64"),
+        "rows": by_month.size().astype("int64"),
+        "digest": by_month.sum(key_fingerprint(products_sales, SALES_COLUMNS)).astype("uint64")
+    })
+
+
+def changed_months(seen: pd.DataFrame, current: pd.DataFrame) -> set:
+    # Buckets whose rows were added, changed or removed since the last run, whatever their
+    # timestamp, so late and backfilled rows are caught too
+    both = seen.merge(current, on="month", how="outer", suffixes=("_seen", "_current"))
+    changed = (
+        both["rows_seen"].ne(both["rows_current"])
+        | both["digest_seen"].ne(both["digest_current"])
+    )
+    months = both.loc[changed, "month"].to_numpy(dtype="int64")
+    # the null-month bucket is recomputed on every refresh anyway
+    return set(months[months >= 0].tolist())
+
+
+def summaries_match(expected: pd.DataFrame, actual: pd.DataFrame, rtol: float = 1e-9) -> bool:
+    # Same rows by key and values up to float rounding, whatever the row order or dtypes
+    def comparable(summary):
+        # the null month and category may come back as None or NaN depending on the path
+        summary = sort_summary(summary)
+        return summary.assign(**{key: summary[key].astype(object).where(summary[key].notna(), None) for key in SUMMARY_SORT})
+
+    try:
+        pd.testing.assert_frame_equal(comparable(expected), comparable(actual), check_dtype=False, check_like=True, rtol=rtol)
+    except AssertionError:
+        return False
+    return True
+
+
+def products_digest(products: pd.DataFrame) -> str:
+    # Order-independent digest of the product -> category mapping the summary was built with
+    return hashlib.sha256(np.sort(key_fingerprint(products, PRODUCT_COLUMNS)).tobytes()).hexdigest()
+
+
+def refresh_monthly_sales(previous: pd.DataFrame, products_sales: pd.DataFrame, products: pd.DataFrame, months: Iterable[int]) -> pd.DataFrame:
+    # Recompute only the given month buckets (and the null-month bucket) and merge them into the stored summary
+    months = np.fromiter(months, dtype="int64")
+    row_months = month_ordinal(products_sales["order_purchase_timestamp"])
+    delta = summarise_monthly_sales(
+        products_sales[np.isin(row_months, months) | (row_months == -1)],
+        products
+    )
+    month_labels = [ordinal_to_month(m) for m in months.tolist()]
+    keep = previous["sales_month"].notna() & ~previous["sales_month"].isin(month_labels)
+    return sort_summary(pd.concat([previous[keep], delta], ignore_index=True))
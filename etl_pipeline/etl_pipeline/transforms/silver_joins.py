@@ -0,0 +1,89 @@
+from typing import List, Optional
+
+import pandas as pd
+
+from .dedup import deduplicate_batches
+from .spill import (
+    ParquetSink,
+    SpillDir,
+    fit_partitions,
+    frame_batches,
+    hash_partition,
+    output_path,
+    parquet_batches,
+    partition_count,
+    read_partition
+)
+
+ORDERS_COLUMNS = ["order_id", "customer_id", "order_purchase_timestamp", "product_id", "payment_value", "order_status"]
+PRODUCTS_SALES_COLUMNS = ['order_id', 'product_id', 'product_category_name_english', 'price', 'freight_value', 'order_purchase_timestamp', 'order_status']
+REVIEWS_RENAME = {'review_score': 'score', 'review_comment_title': 'title', 'review_comment_message': 'comment'}
+
+
+def finish_products_sales(product_sales_df: pd.DataFrame) -> pd.DataFrame:
+    product_sales_df = product_sales_df[PRODUCTS_SALES_COLUMNS]
+    product_sales_df = product_sales_df.assign(
+        total_sales_value=product_sales_df['price'] + product_sales_df['freight_value'],
+        product_id=product_sales_df['product_id'].str.strip('"')
+    )
+    return product_sales_df
+
+
+def spill_orders(orders_path: str, items_path: str, payments_path: str, memory_budget_mb: int, spill_dir: Optional[str] = None) -> ParquetSink:
+    # items, orders and payments are co-partitioned on order_id and joined one partition at a time
+    n_partitions = partition_count([orders_path, items_path, payments_path], memory_budget_mb)
+    sink = ParquetSink(output_path(spill_dir, "silver_olist_orders"))
+    with SpillDir(spill_dir) as tmp_dir:
+        items = hash_partition(parquet_batches(items_path, ["order_id", "product_id"]), "order_id", n_partitions, tmp_dir, "items")
+        orders = hash_partition(parquet_batches(orders_path, ["order_id", "customer_id", "order_purchase_timestamp", "order_status"]), "order_id", n_partitions, tmp_dir, "orders")
+        payments = hash_partition(parquet_batches(payments_path, ["order_id", "payment_value"]), "order_id", n_partitions, tmp_dir, "payments")
+        for items_part, orders_part, payments_part in fit_partitions([items, orders, payments], "order_id", memory_budget_mb, tmp_dir):
+            if items_part is None or orders_part is None or payments_part is None:
+                continue
+            merged_df = pd.merge(read_partition(items_part), read_partition(orders_part), on="order_id")
+            merged_df = pd.merge(merged_df, read_partition(payments_part), on="order_id")[ORDERS_COLUMNS]
+            sink.write(merged_df)
+    sink.close(empty=pd.DataFrame(columns=ORDERS_COLUMNS))
+    return sink
+
+
+def spill_products_sales(items_path: str, products_path: str, orders_path: str, translation: pd.DataFrame, memory_budget_mb: int, spill_dir: Optional[str] = None) -> ParquetSink:
+    # items join products on product_id (translation is small and broadcast to every partition),
+    # the result is re-partitioned on order_id and joined with orders
+    n_partitions = partition_count([items_path, products_path, orders_path], memory_budget_mb)
+    sink = ParquetSink(output_path(spill_dir, "silver_olist_products_sales"))
+    with SpillDir(spill_dir) as tmp_dir:
+        items = hash_partition(parquet_batches(items_path, ["order_id", "product_id", "price", "freight_value"]), "product_id", n_partitions, tmp_dir, "items")
+        products = hash_partition(parquet_batches(products_path, ["product_id", "product_category_name"]), "product_id", n_partitions, tmp_dir, "products")
+
+        def items_with_categories():
+            for items_part, products_part in fit_partitions([items, products], "product_id", memory_budget_mb, tmp_dir):
+                if items_part is None or products_part is None:
+                    continue
+                product_sales_df = pd.merge(read_partition(items_part), read_partition(products_part), on="product_id")
+                yield pd.merge(product_sales_df, translation, on="product_category_name")
+
+        sales = hash_partition(frame_batches(items_with_categories()), "order_id", n_partitions, tmp_dir, "sales")
+        orders = hash_partition(parquet_batches(orders_path, ["order_id", "order_purchase_timestamp", "order_status"]), "order_id", n_partitions, tmp_dir, "orders")
+        for sales_part, orders_part in fit_partitions([sales, orders], "order_id", memory_budget_mb, tmp_dir):
+            if sales_part is None or orders_part is None:
+                continue
+            sink.write(finish_products_sales(pd.merge(read_partition(sales_part), read_partition(orders_part), on="order_id")))
+    sink.close(empty=pd.DataFrame(columns=PRODUCTS_SALES_COLUMNS + ["total_sales_value"]))
+    return sink
+
+
+def stream_reviews(reviews_path: str, keys: List[str], tie_break: str, batch_rows: int, spill_dir: Optional[str] = None) -> ParquetSink:
+    # reviews are read, deduplicated and written batch by batch, so memory is bounded by the batch and the seen keys
+    def batches():
+        for batch in parquet_batches(reviews_path, ["review_id", "order_id", *REVIEWS_RENAME], batch_rows):
+            reviews = batch.to_pandas()
+            yield reviews[reviews["review_comment_message"].notna()].rename(columns=REVIEWS_RENAME)
+
+    deduplicated = deduplicate_batches(batches(), keys, tie_break)
+    sink = ParquetSink(output_path(spill_dir, "silver_olist_reviews"))
+    for reviews in deduplicated:
+        if len(reviews):
+            sink.write(reviews)
+    sink.close(empty=pd.DataFrame(columns=["review_id", "order_id", *REVIEWS_RENAME.values()]))
+    return sink
@@ -0,0 +1,57 @@
+import polars as pl
+
+from .silver_joins import ORDERS_COLUMNS, PRODUCTS_SALES_COLUMNS
+
+# Lazy plans over the bronze parquet files. polars pushes the final projections and filters
+# down into the scans, so only the referenced columns are ever read, joined or copied.
+
+
+def products_plan(products_path: str, translation_path: str) -> pl.LazyFrame:
+    return (
+        pl.scan_parquet(products_path)
+        .join(pl.scan_parquet(translation_path), on="product_category_name", how="inner")
+        .select(["product_id", "product_category_name_english"])
+    )
+
+
+def orders_plan(orders_path: str, items_path: str, payments_path: str) -> pl.LazyFrame:
+    return (
+        pl.scan_parquet(items_path)
+        .join(pl.scan_parquet(orders_path), on="order_id", how="inner")
+        .join(pl.scan_parquet(payments_path), on="order_id", how="inner")
+        .select(ORDERS_COLUMNS)
+    )
+
+
+def reviews_plan(reviews_path: str) -> pl.LazyFrame:
+    return (
+        pl.scan_parquet(reviews_path)
+        .select(["review_id", "order_id", "review_score", "review_comment_title", "review_comment_message"])
+        .filter(pl.col("review_comment_message").is_not_null())
+    )
+
+
+def customers_plan(orders_path: str) -> pl.LazyFrame:
+    return pl.scan_parquet(orders_path).select("customer_id").unique(maintain_order=True)
+
+
+def products_sales_plan(items_path: str, products_path: str, orders_path: str, translation_path: str) -> pl.LazyFrame:
+    return (
+        pl.scan_parquet(items_path)
+        .join(pl.scan_parquet(products_path), on="product_id", how="inner")
+        .join(pl.scan_parquet(translation_path), on="product_category_name", how="inner")
+        .join(pl.scan_parquet(orders_path), on="order_id", how="inner")
+        .select(PRODUCTS_SALES_COLUMNS)
+        .with_columns(
+            total_sales_value=pl.col("price") + pl.col("freight_value"),
+            product_id=pl.col("product_id").str.strip_chars('"')
+        )
+    )
+
+
+def purchases_plan(orders_path: str) -> pl.LazyFrame:
+    return pl.scan_parquet(orders_path).select(
+        "order_id",
+        "customer_id",
+        pl.col("order_purchase_timestamp").str.to_datetime(strict=False).alias("last_purchase_timestamp")
+    )
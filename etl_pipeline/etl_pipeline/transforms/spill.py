@@ -0,0 +1,177 @@
+import math
+import os
+import shutil
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BATCH_ROWS = 65_536
+# In-memory pandas frames are typically several times larger than the uncompressed parquet pages
+MEMORY_EXPANSION = 4
+# A partition still over the budget after this many rounds of salted re-hashing is cut into row chunks
+MAX_SALT = 4
+MB = 1024 * 1024
+
+
+def partition_bytes(path: Optional[str]) -> int:
+    # Estimated in-memory size of a parquet file, from the uncompressed row group sizes
+    if path is None:
+        return 0
+    metadata = pq.read_metadata(path)
+    return MEMORY_EXPANSION * sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+
+
+def partition_count(paths: Iterable[str], memory_budget_mb: int) -> int:
+    return max(1, math.ceil(sum(partition_bytes(path) for path in paths) / (memory_budget_mb * MB)))
+
+
+def parquet_batches(path: str, columns: Optional[List[str]] = None, batch_rows: int = BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    yield from pq.ParquetFile(path).iter_batches(batch_size=batch_rows, columns=columns)
+
+
+def frame_batches(frames: Iterable[pd.DataFrame]) -> Iterator[pa.Table]:
+    for frame in frames:
+        yield pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def hash_partition(batches: Iterable, key: str, n_partitions: int, spill_dir: str, name: str, salt: int = 0) -> List[Optional[str]]:
+    # Route every row to partition hash(key) % n; returns one parquet path per partition (None when empty).
+    # A non-zero salt re-hashes the key hash, so rows that shared a partition spread out differently.
+    paths = [os.path.join(spill_dir, f"{name}-{i:04d}.parquet") for i in range(n_partitions)]
+    writers = {}
+    schema = None
+    try:
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            if isinstance(batch, pa.RecordBatch):
+                batch = pa.Table.from_batches([batch])
+            if schema is None:
+                schema = batch.schema
+            elif batch.schema != schema:
+                batch = batch.cast(schema)
+            keys = batch.column(key).to_pandas().to_numpy(dtype=object)
+            hashes = pd.util.hash_array(keys)
+            if salt:
+                hashes = pd.util.hash_array(hashes ^ np.uint64(salt))
+            buckets = (hashes % np.uint64(n_partitions)).astype("int64")
+            order = np.argsort(buckets, kind="stable")
+            sorted_batch = batch.take(pa.array(order))
+            bounds = np.searchsorted(buckets[order], np.arange(n_partitions + 1))
+            for i in np.flatnonzero(np.diff(bounds)):
+                part = sorted_batch.slice(bounds[i], bounds[i + 1] - bounds[i])
+                if i not in writers:
+                    writers[i] = pq.ParquetWriter(paths[i], part.schema)
+                writers[i].write_table(part)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return [path if i in writers else None for i, path in enumerate(paths)]
+
+
+def fit_partitions(sides: Sequence[List[Optional[str]]], key: str, memory_budget_mb: int, spill_dir: str, salt: int = 0) -> Iterator[Tuple[Optional[str], ...]]:
+    # Yields the co-partitioned paths (one per side) partition by partition. The partition count is
+    # an estimate, and skewed keys can still put far more rows in one partition than the budget holds;
+    # such a partition is hashed again with a new salt. A partition missing on any side is passed
+    # through as is, since the callers run inner joins and skip it.
+    for group in zip(*sides):
+        if None in group or sum(partition_bytes(path) for path in group) <= memory_budget_mb * MB:
+            yield group
+        elif salt >= MAX_SALT:
+            yield from _chunk_partition(group, memory_budget_mb)
+        else:
+            yield from _split_partition(group, key, memory_budget_mb, spill_dir, salt + 1)
+
+
+def _split_partition(group: Tuple[str, ...], key: str, memory_budget_mb: int, spill_dir: str, salt: int) -> Iterator[Tuple[Optional[str], ...]]:
+    n_partitions = max(2, math.ceil(sum(partition_bytes(path) for path in group) / (memory_budget_mb * MB)))
+    rows = [pq.read_metadata(path).num_rows for path in group]
+    split = [
+        hash_partition(parquet_batches(path), key, n_partitions, spill_dir, f"{os.path.basename(path)[:-len('.parquet')]}-s{salt}", salt)
+        for path in group
+    ]
+    # when every row landed in the same partition again, the rows share a few hot keys that no hash separates
+    stuck = any(
+        None not in sub and [pq.read_metadata(path).num_rows for path in sub] == rows
+        for sub in zip(*split)
+    )
+    if stuck:
+        for path in (path for paths in split for path in paths if path is not None):
+            os.remove(path)
+        yield from _chunk_partition(group, memory_budget_mb)
+        return
+    for path in group:
+        os.remove(path)
+    yield from fit_partitions(split, key, memory_budget_mb, spill_dir, salt)
+
+
+def _chunk_partition(group: Tuple[str, ...], memory_budget_mb: int) -> Iterator[Tuple[str, ...]]:
+    # Cut the largest side into row chunks that each join the whole of the other sides. Every chunk
+    # still meets all its matches, so the union of the chunk joins is the inner join of the partition.
+    sizes = [partition_bytes(path) for path in group]
+    big = int(np.argmax(sizes))
+    rest = sum(sizes) - sizes[big]
+    if rest >= memory_budget_mb * MB:
+        raise RuntimeError(
+            f"A spilled join partition of about {sum(sizes) // MB} MB holds too few distinct keys to split, "
+            f"and its smaller sides alone exceed the {memory_budget_mb} MB memory budget; raise memory_budget_mb"
+        )
+    chunk_rows = max(1, int(pq.read_metadata(group[big]).num_rows * (memory_budget_mb * MB - rest) / sizes[big]))
+    stem = group[big][:-len(".parquet")]
+    for i, batch in enumerate(parquet_batches(group[big], batch_rows=chunk_rows)):
+        chunk_path = f"{stem}-c{i:04d}.parquet"
+        pq.write_table(pa.Table.from_batches([batch]), chunk_path)
+        yield group[:big] + (chunk_path,) + group[big + 1:]
+        os.remove(chunk_path)
+
+
+def read_partition(path: Optional[str]) -> Optional[pd.DataFrame]:
+    return None if path is None else pq.read_table(path).to_pandas()
+
+
+class ParquetSink:
+    # Appends DataFrame chunks to one local parquet file, keeping the schema of the first chunk
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.columns = []
+        self._writer = None
+
+    def write(self, frame: pd.DataFrame):
+        if self._writer is None:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+            self.columns = list(frame.columns)
+        else:
+            table = pa.Table.from_pandas(frame, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+        self.rows += len(frame)
+
+    def close(self, empty: Optional[pd.DataFrame] = None):
+        # an empty input still has to produce a readable file
+        if self._writer is None and empty is not None:
+            self.write(empty)
+        if self._writer is not None:
+            self._writer.close()
+
+
+class SpillDir:
+    def __init__(self, base_dir: Optional[str] = None):
+        self.path = tempfile.mkdtemp(prefix="spill-", dir=base_dir)
+
+    def __enter__(self) -> str:
+        return self.path
+
+    def __exit__(self, *exc):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def output_path(base_dir: Optional[str], name: str) -> str:
+    fd, path = tempfile.mkstemp(prefix=f"{name}-", suffix=".parquet", dir=base_dir)
+    os.close(fd)
+    return path
@@ -1,32 +1,75 @@
+-- Mirrors the table specs in etl_pipeline/assets/warehouse_layer.py.
+-- The psql_io_manager creates these objects on first load, this script is for manual setup.
 CREATE SCHEMA IF NOT EXISTS ecom;
 
-CREATE TABLE IF NOT EXISTS ecom.transactions_with_order_items (
-    order_id VARCHAR(255) NOT NULL,
-    list_of_products TEXT NOT NULL
+CREATE TABLE IF NOT EXISTS ecom.warehouse_transactions_with_order_items (
+    order_id VARCHAR(64) NOT NULL,
+    list_of_products TEXT[] NOT NULL,
+    PRIMARY KEY (order_id)
 );
 
 
-CREATE TABLE IF NOT EXISTS ecom.monthly_product_sales_summary (
-    sales_month VARCHAR(255) NOT NULL,
-    product_id VARCHAR(255) NOT NULL,
-    total_sales_value FLOAT NOT NULL,
-    total_products_sold FLOAT NOT NULL
-);
+CREATE TABLE IF NOT EXISTS ecom.warehouse_monthly_product_sales_summary (
+    sales_month DATE,
+    product_category VARCHAR(64),
+    total_sales_value DOUBLE PRECISION NOT NULL,
+    total_products_sold DOUBLE PRECISION NOT NULL
+) PARTITION BY RANGE (sales_month);
+
+-- Monthly partitions are created by the loader for every month present in the data
+CREATE TABLE IF NOT EXISTS ecom.warehouse_monthly_product_sales_summary_default
+    PARTITION OF ecom.warehouse_monthly_product_sales_summary DEFAULT;
 
-CREATE TABLE IF NOT EXISTS ecom.customer_review_summary (
-    customer_id VARCHAR(255) NOT NULL,
+CREATE INDEX IF NOT EXISTS warehouse_monthly_product_sales_summary_sales_month_idx
+    ON ecom.warehouse_monthly_product_sales_summary (sales_month);
+CREATE INDEX IF NOT EXISTS warehouse_monthly_product_sales_summary_product_category_idx
+    ON ecom.warehouse_monthly_product_sales_summary (product_category);
+
+CREATE TABLE IF NOT EXISTS ecom.warehouse_customer_review_summary (
+    customer_id VARCHAR(64) NOT NULL,
+    total_orders INT NOT NULL,
     total_reviews INT NOT NULL,
-    average_review_score FLOAT NOT NULL
+    average_review_score DOUBLE PRECISION NOT NULL,
+    total_spent DOUBLE PRECISION,
+    PRIMARY KEY (customer_id)
 );
 
-CREATE TABLE IF NOT EXISTS ecom.customer_churn (
-    customer_id VARCHAR(255) NOT NULL,
+CREATE TABLE IF NOT EXISTS ecom.warehouse_customer_churn (
+    customer_id VARCHAR(64) NOT NULL,
     total_orders INT NOT NULL,
-    total_spent FLOAT NOT NULL,
-    average_review_score FLOAT NOT NULL,
-    last_purchase_timestamp TIMESTAMP NOT NULL,
-    days_since_last_purchase INT NOT NULL,
-    churn INT NOT NULL
+    total_spent DOUBLE PRECISION,
+    average_review_score DOUBLE PRECISION NOT NULL,
+    last_purchase_timestamp TIMESTAMP,
+    days_since_last_purchase INT,
+    churn INT NOT NULL,
+    PRIMARY KEY (customer_id)
 );
 
+-- total_spent was created NOT NULL before; customers without a payment carry NULL
+ALTER TABLE ecom.warehouse_customer_review_summary ALTER COLUMN total_spent DROP NOT NULL;
+ALTER TABLE ecom.warehouse_customer_churn ALTER COLUMN total_spent DROP NOT NULL;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ecom.mv_monthly_sales AS
+    SELECT sales_month, SUM(total_sales_value) AS total_sales_value, SUM(total_products_sold) AS total_products_sold
+    FROM ecom.warehouse_monthly_product_sales_summary
+    WHERE sales_month IS NOT NULL
+    GROUP BY sales_month;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_monthly_sales_key_idx ON ecom.mv_monthly_sales (sales_month);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ecom.mv_category_sales AS
+    SELECT product_category, SUM(total_sales_value) AS total_sales_value, AVG(total_sales_value) AS average_sales_value
+    FROM ecom.warehouse_monthly_product_sales_summary
+    WHERE product_category IS NOT NULL
+    GROUP BY product_category;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_category_sales_key_idx ON ecom.mv_category_sales (product_category);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ecom.mv_sales_overview AS
+    SELECT 1 AS id, SUM(total_sales_value) AS total_sales_value, AVG(total_sales_value) AS average_sales_value
+    FROM ecom.warehouse_monthly_product_sales_summary;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_sales_overview_key_idx ON ecom.mv_sales_overview (id);
 
+CREATE MATERIALIZED VIEW IF NOT EXISTS ecom.mv_customer_churn_overview AS
+    SELECT 1 AS id, COUNT(*) AS customers, AVG(average_review_score) AS average_review_score,
+           AVG(churn::DOUBLE PRECISION) AS churn_rate, SUM(total_spent) AS total_spent
+    FROM ecom.warehouse_customer_churn;
+CREATE UNIQUE INDEX IF NOT EXISTS mv_customer_churn_overview_key_idx ON ecom.mv_customer_churn_overview (id);
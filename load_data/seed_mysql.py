@@ -0,0 +1,179 @@
+"""Seed the MySQL source schema from the Olist CSVs, loading every table in parallel.
+
+Run with `make mysql_seed`, which copies this directory and the dataset into the
+etl_pipeline container (it has pymysql and the MySQL settings from env) and runs:
+
+    python /tmp/load_data/seed_mysql.py --data-dir /tmp/dataset
+
+Tables are recreated from mysql_schema.sql without their primary keys, loaded concurrently
+(one connection per table) with batched multi-row inserts, and the keys are added once all
+rows are in. Empty CSV fields become NULL and quoted fields may span lines. Any directory
+holding the same file names, e.g. generated benchmark data, can be passed as --data-dir.
+"""
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pymysql
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mysql_schema.sql")
+
+# Candidate file names per table; the first one found in --data-dir is loaded
+TABLE_FILES = {
+    "olist_orders_dataset": ["olist_orders_dataset.csv"],
+    "olist_products_dataset": ["olist_products_dataset.csv"],
+    "olist_order_items_dataset": ["olist_order_items_dataset.csv", "olist_order_item.csv"],
+    "olist_order_payments_dataset": ["olist_order_payments_dataset.csv"],
+    "product_category_name_translation": ["product_category_name_translation.csv"],
+    "olist_order_reviews_dataset": ["olist_order_reviews_dataset.csv"],
+}
+
+CREATE_TABLE = re.compile(r"CREATE\s+TABLE\s+(\w+)", re.IGNORECASE)
+PRIMARY_KEY = re.compile(r",\s*PRIMARY\s+KEY\s*\(([^)]*)\)", re.IGNORECASE)
+
+
+def parse_schema(path):
+    # {table: (create statement without its primary key, primary key columns)}
+    with open(path) as f:
+        statements = [s.strip() for s in f.read().split(";") if s.strip()]
+    tables = {}
+    for statement in statements:
+        match = CREATE_TABLE.search(statement)
+        if match is None:
+            continue
+        key = PRIMARY_KEY.search(statement)
+        create = PRIMARY_KEY.sub("", statement) if key else statement
+        tables[match.group(1)] = (create, key.group(1).replace(" ", "") if key else None)
+    return tables
+
+
+def connect(args, autocommit=False):
+    return pymysql.connect(
+        host=args.host,
+        port=args.port,
+        user=args.user,
+        password=args.password,
+        database=args.database,
+        charset="utf8mb4",
+        autocommit=autocommit
+    )
+
+
+def find_file(data_dir, table):
+    for name in TABLE_FILES[table]:
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_table(args, table, path):
+    start = time.perf_counter()
+    rows = 0
+    conn = connect(args)
+    try:
+        with conn.cursor() as cursor, open(path, newline="", encoding="utf-8-sig") as f:
+            cursor.execute("SET unique_checks = 0, foreign_key_checks = 0")
+            reader = csv.reader(f)
+            header = next(reader)
+            # CSV fields map onto the table columns by position, as LOAD DATA did
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position",
+                (table,)
+            )
+            columns = [row[0] for row in cursor.fetchall()][:len(header)]
+            insert = "INSERT INTO {} ({}) VALUES ({})".format(
+                table,
+                ", ".join(columns),
+                ", ".join(["%s"] * len(columns))
+            )
+            batch, uncommitted = [], 0
+            for record in reader:
+                record = (record + [""] * len(columns))[:len(columns)]
+                batch.append([value if value != "" else None for value in record])
+                if len(batch) >= args.batch_size:
+                    # pymysql rewrites this into a single multi-row INSERT
+                    cursor.executemany(insert, batch)
+                    rows += len(batch)
+                    uncommitted += len(batch)
+                    batch = []
+                    if uncommitted >= args.commit_every:
+                        conn.commit()
+                        uncommitted = 0
+            if batch:
+                cursor.executemany(insert, batch)
+                rows += len(batch)
+        conn.commit()
+    finally:
+        conn.close()
+    return table, rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default="dataset")
+    parser.add_argument("--schema", default=SCHEMA_PATH)
+    parser.add_argument("--host", default=os.getenv("MYSQL_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MYSQL_PORT", "3306")))
+    parser.add_argument("--user", default=os.getenv("MYSQL_USER"))
+    parser.add_argument("--password", default=os.getenv("MYSQL_PASSWORD"))
+    parser.add_argument("--database", default=os.getenv("MYSQL_DATABASE"))
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per multi-row INSERT")
+    parser.add_argument("--commit-every", type=int, default=50000, help="rows per transaction")
+    parser.add_argument("--workers", type=int, default=len(TABLE_FILES))
+    args = parser.parse_args()
+
+    schema = parse_schema(args.schema)
+    files = {table: find_file(args.data_dir, table) for table in schema if table in TABLE_FILES}
+    for table, path in files.items():
+        if path is None:
+            print(f"skip {table}: no CSV in {args.data_dir}")
+    files = {table: path for table, path in files.items() if path is not None}
+
+    conn = connect(args, autocommit=True)
+    try:
+        with conn.cursor() as cursor:
+            for table in files:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+                cursor.execute(schema[table][0])
+
+        start = time.perf_counter()
+        total_rows = 0
+        # largest files first so the longest load is not started last
+        ordered = sorted(files, key=lambda table: os.path.getsize(files[table]), reverse=True)
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(load_table, args, table, files[table]) for table in ordered]
+            for future in as_completed(futures):
+                table, rows, seconds = future.result()
+                total_rows += rows
+                print(f"{table}: {rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+        load_seconds = time.perf_counter() - start
+
+        failed = False
+        with conn.cursor() as cursor:
+            for table in files:
+                key = schema[table][1]
+                if key is None:
+                    continue
+                try:
+                    cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({key})")
+                except pymysql.MySQLError as e:
+                    # duplicate keys, or NULLs in a key column ("Invalid use of NULL value")
+                    print(f"FAIL: cannot add primary key ({key}) to {table}: {e.args[-1]}")
+                    failed = True
+        total_seconds = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    print(f"loaded {total_rows} rows in {load_seconds:.2f}s ({total_rows / max(load_seconds, 1e-9):,.0f} rows/s), "
+          f"{total_seconds:.2f}s including keys")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
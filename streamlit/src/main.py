@@ -1,12 +1,20 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from mlxtend.frequent_patterns import apriori, association_rules
 from mlxtend.preprocessing import TransactionEncoder
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
+import json
 import os
+import threading
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -23,79 +31,130 @@ PSQL_CONFIG = {
     "password": os.getenv("POSTGRES_PASSWORD")
 }
 
+# "warehouse" queries Postgres, "lake" reads the gold parquet snapshots straight from MinIO
+DASHBOARD_SOURCE = os.getenv("DASHBOARD_SOURCE", "warehouse")
 
-def init_connection(config):
-    return psycopg2.connect(
-        database=config['database'],
-        user=config['user'],
-        password=config['password'],
-        host=config['host'],
-        port=config['port']
+MINIO_CONFIG = {
+    "endpoint_url": os.getenv("MINIO_ENDPOINT"),
+    "bucket": os.getenv("DATALAKE_BUCKET"),
+    "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+    "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY")
+}
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    # getconn waits for a free connection instead of raising PoolError once all are lent out
+    def __init__(self, size, **kwargs):
+        self._slots = threading.BoundedSemaphore(size)
+        # minconn == maxconn, so returned connections stay open for the next borrower
+        super().__init__(size, size, **kwargs)
+
+    def getconn(self, key=None):
+        self._slots.acquire()
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+@st.cache_resource
+def init_connection_pool(_config):
+    # Shared across reruns and sessions; loader threads each borrow one connection
+    return BlockingConnectionPool(
+        int(os.getenv("DASHBOARD_POOL_SIZE", "4")),
+        database=_config['database'],
+        user=_config['user'],
+        password=_config['password'],
+        host=_config['host'],
+        port=_config['port']
     )
 
-def extract_data(config, table_name):
-    conn = init_connection(config)
+def extract_query(config, query):
+    pool = init_connection_pool(config)
+    conn = pool.getconn()
     try:
-        query = f'SELECT * FROM ecom.{table_name}'
         print(f"Executing query: {query}")
         df = pd.read_sql(query, conn)
-        print(f"Data extracted from {table_name} with shape: {df.shape}")
+        print(f"Query returned shape: {df.shape}")
         return df
     except Exception as e:
-        print(f"Error extracting data from {table_name}:", e)
+        print(f"Error executing query {query}:", e)
         raise
     finally:
-        if conn:
-            conn.close()
-            print("PostgreSQL connection closed")
+        pool.putconn(conn)
+
+def extract_data(config, table_name):
+    return extract_query(config, f'SELECT * FROM ecom.{table_name}')
 
 
-# Set Streamlit page configuration
-st.set_page_config(page_title="EDA Dashboard", page_icon=":bar_chart:", layout="wide")
+@st.cache_resource
+def init_lake(_config):
+    # Range reads through S3FileSystem fetch only the column chunks a query needs
+    return pafs.S3FileSystem(
+        access_key=_config['aws_access_key_id'],
+        secret_key=_config['aws_secret_access_key'],
+        endpoint_override=_config['endpoint_url'],
+        scheme='http'
+    )
 
-# Load data from PostgreSQL
-df_transactions = extract_data(PSQL_CONFIG, 'warehouse_transactions_with_order_items')
+def extract_lake(config, table_key, columns):
+    fs = init_lake(config)
+    prefix = f"{config['bucket']}/{table_key}"
+    try:
+        # the manifest names the live files of the latest snapshot
+        with fs.open_input_stream(f"{prefix}/_manifest.json") as f:
+            manifest = json.loads(f.read())
+        paths = [f"{config['bucket']}/{entry['key']}" for entry in manifest['files']]
+    except FileNotFoundError:
+        paths = [f"{prefix}.pq"]
+    table = pq.ParquetDataset(paths, filesystem=fs).read(columns=columns)
+    print(f"Data extracted from {table_key} with shape: {(table.num_rows, table.num_columns)}")
+    return table
 
-df_sales = extract_data(PSQL_CONFIG, 'warehouse_monthly_product_sales_summary')
+def load_transactions():
+    if DASHBOARD_SOURCE == "lake":
+        table = extract_lake(MINIO_CONFIG, 'gold/ecom/transactions_with_order_items', ['order_id', 'list_of_products'])
+        # the stored pandas dtype of the list column does not round-trip, plain conversion does
+        return table.to_pandas(ignore_metadata=True)
+    return extract_data(PSQL_CONFIG, 'warehouse_transactions_with_order_items')
 
-# Preprocess the Apriori data
-df_transactions['list_of_products'] = df_transactions['list_of_products'].apply(lambda x: x.split(','))
-records = df_transactions['list_of_products'].tolist()
-te = TransactionEncoder()
-te_ary = te.fit(records).transform(records)
-df_apriori = pd.DataFrame(te_ary, columns=te.columns_)
-frequent_itemsets = apriori(df_apriori, min_support=0.05, use_colnames=True)
-default_categories = set(item for itemset in frequent_itemsets['itemsets'] for item in itemset)
-# Round support values to 2 decimal places
-frequent_itemsets['support'] = frequent_itemsets['support'].round(3)
+def load_sales():
+    columns = ['sales_month', 'product_category', 'total_sales_value', 'total_products_sold']
+    if DASHBOARD_SOURCE == "lake":
+        return extract_lake(MINIO_CONFIG, 'gold/ecom/monthly_product_sales_summary', columns).to_pandas()
+    return extract_data(PSQL_CONFIG, 'warehouse_monthly_product_sales_summary')[columns]
 
-# Convert frozenset to string for visualization
-frequent_itemsets['itemsets'] = frequent_itemsets['itemsets'].apply(lambda x: ', '.join(list(x)))
-#####################################################################################
+def load_sales_overview(df_sales):
+    # Headline totals over every summary row, undated purchases included, and the 10 best selling categories
+    if DASHBOARD_SOURCE == "lake":
+        totals = pd.DataFrame({
+            'total_sales_value': [df_sales['total_sales_value'].sum()],
+            'average_sales_value': [df_sales['total_sales_value'].mean()]
+        })
+        top_categories = (df_sales.groupby('product_category')['total_sales_value'].sum()
+                          .nlargest(10).reset_index())
+        return totals.iloc[0], top_categories
+    # The warehouse keeps both aggregates as materialized views refreshed by each load
+    totals = extract_data(PSQL_CONFIG, 'mv_sales_overview')
+    top_categories = extract_query(PSQL_CONFIG, (
+        'SELECT product_category, total_sales_value FROM ecom.mv_category_sales '
+        'ORDER BY total_sales_value DESC LIMIT 10'
+    ))
+    return totals.iloc[0], top_categories
 
-# Rename columns for better readability
-df_sales.rename(columns={
-    'sales_month': 'Sales Month',
-    'product_category': 'Product Category',
-    'total_sales_value': 'Total Sales Value',
-    'total_products_sold': 'Total Products Sold'
-}, inplace=True)
-# Convert 'Sales Month' to datetime format
-df_sales['Sales Month'] = pd.to_datetime(df_sales['Sales Month'])
-# Sidebar Filters
-default_categories = set(item for itemset in frequent_itemsets['itemsets'] for item in itemset)
-top_10_categories = df_sales.groupby('Product Category')['Total Sales Value'].sum().nlargest(10).index.tolist()
-st.sidebar.header("Filters")
-selected_category = st.sidebar.multiselect(
-    'Select Category', 
-    options=df_sales['Product Category'].unique(), 
-    default=top_10_categories
-)
-date_range = st.sidebar.date_input('Select Date Range', [df_sales['Sales Month'].min(), df_sales['Sales Month'].max()])
-
-# Apply Filters
-filtered_df = df_sales[(df_sales['Product Category'].isin(selected_category)) & 
-                       (df_sales['Sales Month'].between(pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])))]
+def load_average_score():
+    if DASHBOARD_SOURCE == "lake":
+        table = extract_lake(MINIO_CONFIG, 'gold/ecom/customer_churn', ['average_review_score'])
+        return pc.mean(table['average_review_score']).as_py()
+    # Single-row aggregate, refreshed by the warehouse load
+    return extract_data(PSQL_CONFIG, 'mv_customer_churn_overview')['average_review_score'].iloc[0]
 
 
 # Plotly table for Apriori frequent itemsets
@@ -130,75 +189,207 @@ def pie_chart(data):
                 template='ggplot2', color_discrete_sequence=px.colors.qualitative.T10)
     st.plotly_chart(fig, use_container_width=True)
 
+# Charts get at most this many points per series, whatever the size of the filtered frame
+MAX_POINTS = 120
+
+def box_stats(data, by, value):
+    # Tukey box statistics per group, so only five numbers per box go to the browser
+    if data.empty:
+        return pd.DataFrame(columns=[by, 'q1', 'median', 'q3', 'lowerfence', 'upperfence', 'mean', 'count'])
+    grouped = data.groupby(by)[value]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    iqr = stats['q3'] - stats['q1']
+    low = data[by].map(stats['q1'] - 1.5 * iqr)
+    high = data[by].map(stats['q3'] + 1.5 * iqr)
+    inside = data[value].between(low, high)
+    # whiskers end at the most extreme points inside the fences
+    stats['lowerfence'] = data[value].where(inside).groupby(data[by]).min()
+    stats['upperfence'] = data[value].where(inside).groupby(data[by]).max()
+    stats['mean'] = grouped.mean()
+    stats['count'] = grouped.size()
+    return stats.reset_index()
+
+def downsample(data, x, y, color=None, max_points=MAX_POINTS):
+    # Sum each series into at most max_points consecutive buckets of x, labelled by the bucket start
+    wide = data.pivot_table(index=x, columns=color, values=y, aggfunc='sum') if color else data.groupby(x)[[y]].sum()
+    wide = wide.sort_index()
+    step = int(np.ceil(len(wide) / max_points)) if len(wide) > max_points else 1
+    if step > 1:
+        buckets = np.arange(len(wide)) // step
+        labels = wide.index.to_series().groupby(buckets).first()
+        wide = wide.groupby(buckets).sum(min_count=1)
+        wide.index = labels.to_numpy()
+        wide.index.name = x
+    if not color:
+        return wide.reset_index()
+    return wide.reset_index().melt(id_vars=x, var_name=color, value_name=y).dropna(subset=[y])
+
 # Area Chart via on category
 def area_chart(data):
-    fig = px.area(data, x='Sales Month', y='Total Sales Value', color='Product Category', 
+    series = downsample(data, 'Sales Month', 'Total Sales Value', color='Product Category')
+    fig = px.area(series, x='Sales Month', y='Total Sales Value', color='Product Category', 
                 template='simple_white', color_discrete_sequence=px.colors.qualitative.T10)
     st.plotly_chart(fig, use_container_width=True)
 
 # Box Plot via on category
 def box_plot(data):
-    fig = px.box(data, x='Product Category', y='Total Sales Value', color='Product Category', 
-                template='plotly_dark', color_discrete_sequence=px.colors.qualitative.T10)
+    stats = box_stats(data, 'Product Category', 'Total Sales Value')
+    fig = go.Figure()
+    colors = px.colors.qualitative.T10
+    for i, row in enumerate(stats.itertuples(index=False)):
+        fig.add_trace(go.Box(
+            name=row[0],
+            x=[row[0]],
+            q1=[row.q1], median=[row.median], q3=[row.q3],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+            mean=[row.mean],
+            marker_color=colors[i % len(colors)]
+        ))
+    fig.update_layout(template='plotly_dark', xaxis_title='Product Category', yaxis_title='Total Sales Value',
+                      legend_title_text='Product Category')
     st.plotly_chart(fig, use_container_width=True)
 
+def load_itemsets():
+    df_transactions = load_transactions()
+    # Preprocess the Apriori data (list_of_products is a TEXT[] column or an Arrow list, both give one sequence per order)
+    records = df_transactions['list_of_products'].tolist()
+    te = TransactionEncoder()
+    te_ary = te.fit(records).transform(records)
+    df_apriori = pd.DataFrame(te_ary, columns=te.columns_)
+    frequent_itemsets = apriori(df_apriori, min_support=0.05, use_colnames=True)
+    # Round support values to 2 decimal places
+    frequent_itemsets['support'] = frequent_itemsets['support'].round(3)
+
+    # Convert frozenset to string for visualization
+    frequent_itemsets['itemsets'] = frequent_itemsets['itemsets'].apply(lambda x: ', '.join(list(x)))
+    return frequent_itemsets
+
+SALES_LABELS = {
+    'sales_month': 'Sales Month',
+    'product_category': 'Product Category',
+    'total_sales_value': 'Total Sales Value',
+    'total_products_sold': 'Total Products Sold'
+}
+
+def prepare_sales():
+    df_sales = load_sales()
+    totals, top_categories = load_sales_overview(df_sales)
+    # Rename columns for better readability
+    df_sales = df_sales.rename(columns=SALES_LABELS)
+    # Convert 'Sales Month' to datetime format
+    df_sales['Sales Month'] = pd.to_datetime(df_sales['Sales Month'])
+    return df_sales, totals, top_categories.rename(columns=SALES_LABELS)
+
+def section_title(title):
+    st.markdown(f"<h3 style='color: #FF69B4;'>{title}</h3>", unsafe_allow_html=True)
+
+def render_itemsets(placeholder, frequent_itemsets):
+    with placeholder.container():
+        section_title("Frequent Itemsets:")
+        apriori_table(frequent_itemsets)
+
+def render_average_score(placeholder, average_score):
+    average_score = round(average_score, 1)
+    star_rating = ':star:' * int(round(average_score, 1))
+    with placeholder.container():
+        # average score of reviews
+        section_title("Average score:")
+        st.subheader(f"{average_score} {star_rating}")
+
+def render_sales(placeholders, sales):
+    df_sales, totals, top_10_categories = sales
+    with placeholders['total_sales'].container():
+        section_title("Total Sales Value:")
+        st.subheader(f"US $ {round(totals['total_sales_value'])}")
+    with placeholders['average_sales'].container():
+        section_title("Average Sales Value:")
+        st.subheader(f"US $ {round(totals['average_sales_value'])}")
+
+    # Sidebar Filters
+    st.sidebar.header("Filters")
+    selected_category = st.sidebar.multiselect(
+        'Select Category', 
+        options=df_sales['Product Category'].unique(), 
+        default=top_10_categories['Product Category'].tolist()
+    )
+    date_range = st.sidebar.date_input('Select Date Range', [df_sales['Sales Month'].min(), df_sales['Sales Month'].max()])
+
+    # Apply Filters
+    filtered_df = df_sales[(df_sales['Product Category'].isin(selected_category)) & 
+                           (df_sales['Sales Month'].between(pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])))]
+
+    with placeholders['sales_over_time'].container():
+        section_title("Total Sales Value Over Time by Month:")
+        sales_by_month = downsample(filtered_df, "Sales Month", "Total Sales Value")
+        fig_line = px.line(sales_by_month, x="Sales Month", y="Total Sales Value",
+                           markers=True,
+                           template="plotly_white",
+                           color_discrete_sequence=['#E377C2'])
+        st.plotly_chart(fig_line, use_container_width=True)
+
+        st.divider()
+    with placeholders['sales_by_category_over_time'].container():
+        section_title("Total Sales Value Over Time By Category:")
+        area_chart(filtered_df)
+    with placeholders['sales_by_category'].container():
+        section_title("Total Sales Value by Category:")
+        pie_chart(filtered_df)
+    with placeholders['sales_distribution'].container():
+        section_title("Distribution of Total Sales Value by Category:")
+        box_plot(filtered_df)
+
+    # bar chart for top 10 categories with highest total sale values
+    with placeholders['top_categories'].container():
+        section_title("Top 10 Categories With Highest Total Sale Values")
+        fig = px.bar(top_10_categories, x='Product Category', y='Total Sales Value', 
+                     color='Product Category', 
+                     template='plotly_white', 
+                     color_discrete_sequence=px.colors.qualitative.T10)
+        st.plotly_chart(fig, use_container_width=True)
+
 ############################################################################################################
 
+# Set Streamlit page configuration
+st.set_page_config(page_title="EDA Dashboard", page_icon=":bar_chart:", layout="wide")
+
 # Layout in Streamlit
 st.title("Ecommerce EDA Dashboard🛒")
 
-# Calculate total sales value, count of products, and average sales value
-total_sales = df_sales["Total Sales Value"].sum()
-average_sales = df_sales["Total Sales Value"].mean()
-df_churn = extract_data(PSQL_CONFIG,'warehouse_customer_churn')
-average_score = round(df_churn['average_review_score'].mean(), 1)
-star_rating = ':star:' * int(round(average_score, 1))
-
+# Lay out every section up front and fill each one as soon as its data arrives
 left_column, right_column = st.columns(2)
 with left_column:
-    st.markdown("<h3 style='color: #FF69B4;'>Frequent Itemsets:</h3>", unsafe_allow_html=True)
-    apriori_table(frequent_itemsets)
+    itemsets_placeholder = st.empty()
+    itemsets_placeholder.info("Loading frequent itemsets...")
 with right_column:
-    # total sales value
-    st.markdown("<h3 style='color: #FF69B4;'>Total Sales Value:</h3>", unsafe_allow_html=True)
-    st.subheader(f"US $ {round(total_sales)}")
-    # average score of reviews
-    st.markdown("<h3 style='color: #FF69B4;'>Average score:</h3>", unsafe_allow_html=True)
-    st.subheader(f"{average_score} {star_rating}")
-    # average sales value
-    st.markdown("<h3 style='color: #FF69B4;'>Average Sales Value:</h3>", unsafe_allow_html=True)
-    st.subheader(f"US $ {round(average_sales)}")
-
+    sales_placeholders = {'total_sales': st.empty()}
+    score_placeholder = st.empty()
+    sales_placeholders['average_sales'] = st.empty()
 col1, col2 = st.columns(2)
 with col1:
-    st.markdown("<h3 style='color: #FF69B4;'>Total Sales Value Over Time by Month:</h3>", unsafe_allow_html=True)
-    sales_by_month = filtered_df.groupby("Sales Month")["Total Sales Value"].sum().reset_index()
-    fig_line = px.line(sales_by_month, x="Sales Month", y="Total Sales Value",
-                       markers=True,
-                       template="plotly_white",
-                       color_discrete_sequence=['#E377C2'])
-    st.plotly_chart(fig_line, use_container_width=True)
-
-    st.divider()
+    sales_placeholders['sales_over_time'] = st.empty()
 with col2:
-    st.markdown("<h3 style='color: #FF69B4;'>Total Sales Value Over Time By Category:</h3>", unsafe_allow_html=True)
-    area_chart(filtered_df)
+    sales_placeholders['sales_by_category_over_time'] = st.empty()
 col3, col4 = st.columns(2)
 with col3:
-    st.markdown("<h3 style='color: #FF69B4;'>Total Sales Value by Category:</h3>", unsafe_allow_html=True)
-    pie_chart(filtered_df)
+    sales_placeholders['sales_by_category'] = st.empty()
 with col4:
-    st.markdown("<h3 style='color: #FF69B4;'>Distribution of Total Sales Value by Category:</h3>", unsafe_allow_html=True)
-    box_plot(filtered_df)
-
-
-# bar chart for top 3 categories with highest total sale values
-top_10_categories = df_sales.groupby('Product Category')['Total Sales Value'].sum().nlargest(10).reset_index()
-st.markdown("<h3 style='color: #FF69B4;'>Top 10 Categories With Highest Total Sale Values</h3>", unsafe_allow_html=True)
-fig = px.bar(top_10_categories, x='Product Category', y='Total Sales Value', 
-             color='Product Category', 
-             template='plotly_white', 
-             color_discrete_sequence=px.colors.qualitative.T10)
-st.plotly_chart(fig, use_container_width=True)
+    sales_placeholders['sales_distribution'] = st.empty()
+sales_placeholders['top_categories'] = st.empty()
+sales_placeholders['sales_over_time'].info("Loading sales...")
 
+# Create the shared pool (or lake filesystem) here so the loader threads only read the cache
+if DASHBOARD_SOURCE == "lake":
+    init_lake(MINIO_CONFIG)
+else:
+    init_connection_pool(PSQL_CONFIG)
 
+# Loaders run concurrently; Streamlit elements are only written from this (the script) thread
+with ThreadPoolExecutor(max_workers=3) as executor:
+    futures = {
+        executor.submit(load_itemsets): lambda result: render_itemsets(itemsets_placeholder, result),
+        executor.submit(prepare_sales): lambda result: render_sales(sales_placeholders, result),
+        executor.submit(load_average_score): lambda result: render_average_score(score_placeholder, result)
+    }
+    for future in as_completed(futures):
+        futures[future](future.result())